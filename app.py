@@ -14,233 +14,110 @@
  * 日期：2025.11.12
 """
 
+import logging
 import os
-from flask import Flask, render_template, request, jsonify
-from dotenv import load_dotenv
-from volcenginesdkarkruntime import Ark
-
-# 加载环境变量
-# 从 .env 文件中读取配置信息（如 API 密钥）
-load_dotenv()
-
-# 初始化 Flask 应用
-app = Flask(__name__)
-
-# 配置应用
-# 从环境变量中获取 API 密钥
-app.config['ARK_API_KEY'] = os.getenv('ARK_API_KEY')
-
-# 初始化 Ark 客户端（使用火山引擎 ARK API）
-# 用于后续调用 API 服务
-client = Ark(api_key=os.environ.get("ARK_API_KEY"))
-
-# 书籍类别数据结构
-# 定义系统支持的所有书籍类别及其子类别
-BOOK_CATEGORIES = {
-    "literature": {
-        "id": "literature",
-        "name": "文学类",
-        "subcategories": ["小说", "散文", "诗歌", "经典名著", "当代文学", "外国文学"]
-    },
-    "social_science": {
-        "id": "social_science",
-        "name": "社科类",
-        "subcategories": ["历史", "哲学", "心理学", "社会学", "政治", "经济学"]
-    },
-    "technology": {
-        "id": "technology",
-        "name": "科技类",
-        "subcategories": ["科普", "互联网", "人工智能", "编程技术", "科学史"]
-    },
-    "business": {
-        "id": "business",
-        "name": "商业类",
-        "subcategories": ["管理", "创业", "营销", "投资理财", "职场"]
-    },
-    "lifestyle": {
-        "id": "lifestyle",
-        "name": "生活类",
-        "subcategories": ["健康养生", "美食", "旅行", "家居", "时尚"]
-    },
-    "personal_growth": {
-        "id": "personal_growth",
-        "name": "成长类",
-        "subcategories": ["自我提升", "励志", "学习方法", "时间管理", "沟通技巧"]
-    },
-    "arts": {
-        "id": "arts",
-        "name": "艺术类",
-        "subcategories": ["绘画", "音乐", "摄影", "设计", "电影"]
-    },
-    "children": {
-        "id": "children",
-        "name": "儿童类",
-        "subcategories": ["绘本", "儿童文学", "科普读物", "教育"]
-    },
-    "comics": {
-        "id": "comics",
-        "name": "漫画类",
-        "subcategories": ["国漫", "日漫", "欧美漫画"]
-    },
-    "mystery": {
-        "id": "mystery",
-        "name": "悬疑推理",
-        "subcategories": ["推理小说", "悬疑小说", "犯罪小说"]
-    },
-    "scifi_fantasy": {
-        "id": "scifi_fantasy",
-        "name": "科幻奇幻",
-        "subcategories": ["科幻小说", "奇幻小说", "玄幻小说"]
-    },
-    "romance": {
-        "id": "romance",
-        "name": "言情类",
-        "subcategories": ["现代言情", "古代言情", "都市情感"]
-    }
-}
-
-
-def build_prompt(mood, categories=None):
-    """
-    构建推荐提示词，根据用户心情和类别偏好生成合适的 prompt
+from flask import Blueprint, Flask, render_template, request, jsonify
+from werkzeug.exceptions import HTTPException
+
+from backends import REQUEST_TIMEOUT, get_router
+from cache import get_cache, make_cache_key
+from profiles import MAX_PROFILE_FAVORITES, ProfileStore, is_valid_favorite, is_valid_profile_id
+from recommend_core import (BOOK_CATEGORIES, RECOMMEND_MAX_COUNT,
+                            SYSTEM_PROMPT, build_prompt, max_tokens_for, parse_response,
+                            validate_categories)
+
+# 注意：python-dotenv 和模型 SDK 都在首次使用时才导入
+# ARK SDK 依赖树较大，模块导入时加载会显著拖慢冷启动，
+# 而只访问 / 和 /api/categories 的进程根本不需要它
+# 模型后端的配置和路由见 backends.py，推荐结果缓存见 cache.py，
+# 书籍类别、提示词构建和响应解析见 recommend_core.py，用户收藏画像见 profiles.py
+
+# 路由蓝图
+# 所有路由注册在蓝图上，由 create_app() 挂载到应用实例
+bp = Blueprint('books', __name__)
+
+# 日志记录器
+# 与 Flask 的 app.logger 同名，在应用上下文之外调用推荐函数时也能记录日志
+logger = logging.getLogger(__name__)
 
-    此函数将用户的心情描述和可选的类别偏好转换为结构化的提示词，
-    指导 GPT 模型生成符合要求的书籍推荐结果。
+# 请求体大小上限（字节），足以容纳 MAX_PROFILE_FAVORITES 本收藏的同步请求，超出时返回 413
+MAX_CONTENT_LENGTH = 2 * 1024 * 1024
+
+
+def create_app(config=None):
+    """
+    应用工厂，创建并配置 Flask 应用
 
     参数：
-        mood (str): 用户输入的心情描述
-        categories (list, optional): 用户选择的类别 ID 列表
+        config (dict, optional): 覆盖默认配置的配置项
 
     返回：
-        str: 格式化的提示词，包含推荐要求和输出格式说明
+        Flask: 配置完成的 Flask 应用实例
+    """
+    # 加载环境变量
+    # 从 .env 文件中读取配置信息（如 API 密钥）
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    # 初始化 Flask 应用
+    app = Flask(__name__)
+
+    # 配置应用
+    # 从环境变量中获取 API 密钥
+    app.config['ARK_API_KEY'] = os.getenv('ARK_API_KEY')
+    app.config['MAX_CONTENT_LENGTH'] = MAX_CONTENT_LENGTH
+    if config:
+        app.config.update(config)
+
+    # 用户画像与推荐结果共用同一个共享缓存（L2），多个工作进程、多个节点看到相同的画像
+    # 未配置共享缓存（CACHE_BACKEND=memory）时画像只保存在进程内存中
+    profile_store.l2 = get_cache().l2
 
-    示例：
-        >>> build_prompt("开心", ["literature", "arts"])
-        "你是一位专业的图书推荐专家。用户当前的心情是：开心..."
+    # 注册路由
+    app.register_blueprint(bp)
+    return app
+
+
+def __getattr__(name):
     """
-    # 基础提示词
-    prompt = f"""你是一位专业的图书推荐专家。用户当前的心情是：{mood}"""
-
-    # 如果用户指定了类别偏好，添加到提示词中
-    if categories:
-        category_names = [BOOK_CATEGORIES[cat]["name"] for cat in categories]
-        prompt += f"\n\n用户偏好的书籍类别：{', '.join(category_names)}"
-        prompt += "\n请优先推荐这些类别的书籍。"
-
-    # 添加推荐要求和格式说明
-    prompt += """
-
-请根据用户的心情推荐 3-5 本适合的书籍。对于每本书，请提供：
-1. 书名
-2. 作者
-3. 推荐理由（说明为什么这本书适合用户当前的心情）
-4. 书籍类别（从以下类别中选择）
-5. 书籍子类别（可选）
-
-可用的书籍类别：
-- 文学类：小说、散文、诗歌、经典名著、当代文学、外国文学
-- 社科类：历史、哲学、心理学、社会学、政治、经济学
-- 科技类：科普、互联网、人工智能、编程技术、科学史
-- 商业类：管理、创业、营销、投资理财、职场
-- 生活类：健康养生、美食、旅行、家居、时尚
-- 成长类：自我提升、励志、学习方法、时间管理、沟通技巧
-- 艺术类：绘画、音乐、摄影、设计、电影
-- 儿童类：绘本、儿童文学、科普读物、教育
-- 漫画类：国漫、日漫、欧美漫画
-- 悬疑推理：推理小说、悬疑小说、犯罪小说
-- 科幻奇幻：科幻小说、奇幻小说、玄幻小说
-- 言情类：现代言情、古代言情、都市情感
-
-请以 JSON 格式返回推荐结果，格式如下：
-[
-  {
-    "title": "书名",
-    "author": "作者",
-    "reason": "推荐理由",
-    "category": "类别名称（如：文学类）",
-    "subcategory": "子类别（如：小说）"
-  }
-]
-
-只返回 JSON 数组，不要包含其他文字说明。"""
-    return prompt
-
-
-def parse_response(response_text):
+    模块级 app 属性的延迟创建
+
+    兼容 `gunicorn app:app` 和 `flask --app app run` 等按属性名取应用的方式，
+    只有真正访问 app 时才会调用 create_app()。
     """
-    解析 API 响应，提取书名、作者、推荐理由和类别信息
+    if name == 'app':
+        app = create_app()
+        globals()['app'] = app
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-    此函数负责将 OpenAI API 返回的文本响应解析为结构化的数据。
-    支持直接 JSON 解析和从文本中提取 JSON 的容错处理。
 
-    参数：
-        response_text (str): OpenAI API 返回的原始文本响应
+# 全局画像存储实例
+profile_store = ProfileStore()
 
-    返回：
-        list: 包含推荐书籍的列表，每个元素是一个字典，包含：
-            - title (str): 书名
-            - author (str): 作者
-            - reason (str): 推荐理由
-            - category (str): 书籍类别
-            - subcategory (str, optional): 书籍子类别
 
-    异常：
-        ValueError: 当响应格式不正确或缺少必需字段时抛出
+def get_book_recommendations(mood, categories=None, max_count=RECOMMEND_MAX_COUNT):
+    """
+    获取书籍推荐，优先使用缓存
 
-    示例：
-        >>> parse_response('[{"title":"书名","author":"作者","reason":"理由","category":"文学类","subcategory":"小说"}]')
-        [{'title': '书名', 'author': '作者', 'reason': '理由', 'category': '文学类', 'subcategory': '小说'}]
+    相同心情、类别和数量的请求共享缓存结果（见 cache.py），
+    未命中时调用 fetch_book_recommendations 请求模型。
+
+    参数：
+        mood (str): 用户输入的心情描述
+        categories (list, optional): 用户选择的类别 ID 列表
+        max_count (int, optional): 向模型请求的推荐数量上限
+
+    返回：
+        list: 推荐书籍列表，每个元素包含 title、author、reason、category、subcategory
     """
-    import json
-    try:
-        # 尝试直接解析 JSON
-        # 大多数情况下，GPT 会直接返回有效的 JSON 格式
-        recommendations = json.loads(response_text)
-
-        # 验证数据结构
-        # 确保返回的是列表类型
-        if not isinstance(recommendations, list):
-            raise ValueError("响应格式不正确")
-
-        # 确保每个推荐都有必需的字段
-        # 验证数据完整性，防止缺少关键信息
-        for rec in recommendations:
-            # 检查基本必需字段
-            if not all(key in rec for key in ['title', 'author', 'reason']):
-                raise ValueError("推荐数据缺少必需字段")
-
-            # 检查类别字段，如果缺少则设置默认值
-            if 'category' not in rec:
-                rec['category'] = '其他'
-
-            # subcategory 是可选字段，如果不存在则设置为空字符串
-            if 'subcategory' not in rec:
-                rec['subcategory'] = ''
+    key = make_cache_key(mood, categories, max_count)
+    return get_cache().get_or_compute(
+        key, lambda: fetch_book_recommendations(mood, categories, max_count)
+    )
 
-        return recommendations
-    except json.JSONDecodeError:
-        # 如果直接解析失败，尝试从文本中提取 JSON 部分
-        # 这是一个容错机制，处理 GPT 可能在 JSON 前后添加说明文字的情况
-        import re
-        json_match = re.search(r'\[.*\]', response_text, re.DOTALL)
-        if json_match:
-            try:
-                recommendations = json.loads(json_match.group())
-                # 对提取的 JSON 也进行字段验证和补充
-                for rec in recommendations:
-                    if not all(key in rec for key in ['title', 'author', 'reason']):
-                        raise ValueError("推荐数据缺少必需字段")
-                    if 'category' not in rec:
-                        rec['category'] = '其他'
-                    if 'subcategory' not in rec:
-                        rec['subcategory'] = ''
-                return recommendations
-            except:
-                pass
-        raise ValueError("无法解析 API 响应")
-
-
-def get_book_recommendations(mood, categories=None):
+
+def fetch_book_recommendations(mood, categories=None, max_count=RECOMMEND_MAX_COUNT):
     """
     调用 OpenAI API，传递心情描述和类别偏好并获取推荐
 
@@ -249,6 +126,7 @@ def get_book_recommendations(mood, categories=None):
     参数：
         mood (str): 用户输入的心情描述
         categories (list, optional): 用户选择的类别 ID 列表
+        max_count (int, optional): 向模型请求的推荐数量上限
 
     返回：
         list: 推荐书籍列表，每个元素包含 title、author、reason、category、subcategory
@@ -257,35 +135,29 @@ def get_book_recommendations(mood, categories=None):
         Exception: 当 API 调用失败时抛出，包含详细错误信息
 
     注意：
-        - 设置了 30 秒超时限制
-        - 使用 gpt-3.5-turbo 模型
+        - 设置了 60 秒超时限制
+        - 模型由 backends.py 中的路由器按后端延迟、错误率和剩余配额选择
         - temperature 设置为 0.7，平衡创造性和准确性
     """
     try:
         # 构建提示词
         # 将用户心情和类别偏好转换为 GPT 可理解的推荐请求
-        prompt = build_prompt(mood, categories)
+        prompt = build_prompt(mood, categories, max_count)
 
-        # 调用 Ark API
-        # 使用 chat completions API 进行对话式交互
-        response = client.chat.completions.create(
-            model="doubao-seed-1-6-251015",
+        # 调用模型 API
+        # 路由器选择合适的后端发送 chat completions 请求，失败时自动切换后端
+        response_text = get_router().complete(
             messages=[
                 # system 消息：定义 AI 助手的角色和行为
-                {"role": "system", "content": "你是一位专业的图书推荐专家，擅长根据用户心情推荐合适的书籍。"},
+                {"role": "system", "content": SYSTEM_PROMPT},
                 # user 消息：包含用户的实际请求
                 {"role": "user", "content": prompt}
             ],
-            reasoning_effort = "minimal",  # 控制推理时长，最快推理
             temperature=0.7,  # 控制输出的随机性，0.7 提供适度的创造性
-            max_tokens=1500,  # 增加限制以容纳类别信息
-            timeout=60  # 60 秒超时，符合需求规范
+            max_tokens=max_tokens_for(max_count),  # 按书籍数量预留输出长度，容纳类别信息
+            timeout=REQUEST_TIMEOUT  # 60 秒超时，符合需求规范
         )
 
-        # 提取响应内容
-        # 从 API 响应对象中获取实际的文本内容
-        response_text = response.choices[0].message.content.strip()
-
         # 解析响应
         # 将文本格式的响应转换为结构化的推荐列表
         recommendations = parse_response(response_text)
@@ -295,11 +167,11 @@ def get_book_recommendations(mood, categories=None):
     except Exception as e:
         # 捕获 API 调用异常
         # 记录错误日志，便于调试和监控
-        app.logger.error(f"OpenAI API 调用失败: {str(e)}")
+        logger.error(f"OpenAI API 调用失败: {str(e)}")
         raise
 
 
-@app.route('/')
+@bp.route('/')
 def index():
     """
     主页路由，返回 HTML 页面
@@ -312,7 +184,7 @@ def index():
     return render_template('index.html')
 
 
-@app.route('/api/categories', methods=['GET'])
+@bp.route('/api/categories', methods=['GET'])
 def get_categories():
     """
     类别 API 端点，返回所有可用的书籍类别列表
@@ -336,7 +208,7 @@ def get_categories():
     return jsonify({'categories': categories_list}), 200
 
 
-@app.route('/api/recommend', methods=['POST'])
+@bp.route('/api/recommend', methods=['POST'])
 def recommend():
     """
     推荐 API 端点，接收心情输入并返回书籍推荐
@@ -346,9 +218,13 @@ def recommend():
     请求格式：
         {
             "mood": "用户心情描述",
-            "categories": ["literature", "technology"]  // 可选
+            "categories": ["literature", "technology"],  // 可选
+            "profile_id": "客户端画像 ID"                 // 可选
         }
 
+    传入 profile_id 时会使用该用户的收藏画像：未选择类别时自动补充偏好类别，
+    并在本地过滤已收藏的书籍、按画像重新排序。
+
     成功响应 (200)：
         {
             "recommendations": [
@@ -393,25 +269,44 @@ def recommend():
         # 获取可选的类别参数
         categories = data.get('categories', [])
 
-        # 验证 categories 参数格式
-        if categories is not None:
-            # 确保 categories 是列表类型
-            if not isinstance(categories, list):
-                return jsonify({'error': 'categories 参数必须是数组'}), 400
+        # 验证 categories 参数格式和每个类别 ID 是否有效
+        error = validate_categories(categories)
+        if error:
+            return jsonify({'error': error}), 400
+
+        # 获取可选的画像 ID
+        profile_id = data.get('profile_id')
+        if profile_id is not None and not is_valid_profile_id(profile_id):
+            return jsonify({'error': '无效的 profile_id'}), 400
+
+        # 取得画像快照，之后的偏好类别、候选数量和重排都在快照上本地完成
+        profile = profile_store.get(profile_id) if profile_id else None
+
+        # 用户未选择类别时，使用收藏画像中权重最高的类别作为偏好
+        if not categories and profile is not None:
+            categories = profile.top_categories()
 
-            # 验证每个类别 ID 是否有效
-            for category_id in categories:
-                if category_id not in BOOK_CATEGORIES:
-                    return jsonify({'error': f'无效的类别 ID: {category_id}'}), 400
+        # 用户已有收藏时多请求几本候选，本地过滤重复后仍能凑满结果
+        max_count = RECOMMEND_MAX_COUNT
+        if profile is not None:
+            max_count += profile.overfetch_count()
 
         # 调用 OpenAI 集成函数获取推荐结果
         # 这是核心业务逻辑，调用 GPT 模型生成推荐
-        recommendations = get_book_recommendations(mood, categories if categories else None)
+        recommendations = get_book_recommendations(mood, categories if categories else None, max_count)
+
+        # 过滤已收藏的书籍并按画像重新排序
+        if profile is not None:
+            recommendations = profile.rerank(recommendations)
 
         # 返回 JSON 格式的推荐数据
         # 成功响应，返回 200 状态码
         return jsonify({'recommendations': recommendations}), 200
 
+    except HTTPException:
+        # 请求体过大等 HTTP 错误保持原有状态码
+        raise
+
     except ValueError as e:
         # 处理解析错误
         # 当 API 响应格式不符合预期时触发
@@ -438,8 +333,84 @@ def recommend():
             return jsonify({'error': '获取推荐时出错，请稍后再试'}), 500
 
 
+@bp.route('/api/profile/<profile_id>/sync', methods=['POST'])
+def sync_profile(profile_id):
+    """
+    画像同步端点，用完整的收藏列表重建用户画像
+
+    处理 POST /api/profile/<profile_id>/sync 请求。
+    客户端在页面加载时调用一次，之后通过增量端点更新。
+
+    请求格式：
+        {
+            "favorites": [
+                {"id": "...", "title": "书名", "author": "作者", "category": "文学类", "subcategory": "小说"}
+            ]
+        }
+
+    成功响应 (200)：
+        {"count": 收藏数量}
+    """
+    if not is_valid_profile_id(profile_id):
+        return jsonify({'error': '无效的 profile_id'}), 400
+
+    data = request.get_json(silent=True)
+    favorites = data.get('favorites') if isinstance(data, dict) else None
+    if not isinstance(favorites, list):
+        return jsonify({'error': 'favorites 参数必须是数组'}), 400
+
+    if len(favorites) > MAX_PROFILE_FAVORITES:
+        return jsonify({'error': f'收藏数量不能超过 {MAX_PROFILE_FAVORITES} 本'}), 400
+
+    # 跳过格式不正确的收藏项，与客户端加载收藏时的容错处理保持一致
+    valid_favorites = [fav for fav in favorites if is_valid_favorite(fav)]
+    profile = profile_store.replace(profile_id, valid_favorites)
+    return jsonify({'count': len(profile.books)}), 200
+
+
+@bp.route('/api/profile/<profile_id>/favorites', methods=['POST'])
+def add_profile_favorite(profile_id):
+    """
+    收藏添加端点，增量更新用户画像
+
+    处理 POST /api/profile/<profile_id>/favorites 请求，请求体为单本收藏数据。
+
+    成功响应 (200)：
+        {"added": true/false}
+    """
+    if not is_valid_profile_id(profile_id):
+        return jsonify({'error': '无效的 profile_id'}), 400
+
+    book = request.get_json(silent=True)
+    if not is_valid_favorite(book):
+        return jsonify({'error': '无效的收藏数据'}), 400
+
+    added = profile_store.add_favorite(profile_id, book['id'], book)
+    return jsonify({'added': added}), 200
+
+
+@bp.route('/api/profile/<profile_id>/favorites/<book_id>', methods=['DELETE'])
+def remove_profile_favorite(profile_id, book_id):
+    """
+    收藏删除端点，增量更新用户画像
+
+    处理 DELETE /api/profile/<profile_id>/favorites/<book_id> 请求。
+
+    成功响应 (200)：
+        {"removed": true/false}
+    """
+    if not is_valid_profile_id(profile_id):
+        return jsonify({'error': '无效的 profile_id'}), 400
+
+    removed = profile_store.remove_favorite(profile_id, book_id)
+    return jsonify({'removed': removed}), 200
+
+
 if __name__ == '__main__':
     # 应用启动入口
+    # 先创建应用，create_app() 会加载 .env 中的 PORT 和 FLASK_ENV
+    app = create_app()
+
     # 从环境变量读取端口号，默认为 5000
     port = int(os.getenv('PORT', 5000))
 
@@ -0,0 +1,431 @@
+"""
+模型后端注册表与路由
+
+管理多个 OpenAI 兼容的模型后端（火山引擎 ARK、OpenAI 以及其他兼容服务），
+并根据各后端的实时表现分配请求。
+
+主要功能：
+- 后端注册表：每个后端有独立的模型、连接池、并发上限、请求配额和成本
+- 路由器：根据延迟/错误率的指数加权移动平均（EWMA）和剩余配额选择后端
+- 故障转移：连接错误、超时、429 和 5xx 时短暂退避后切换到下一个可用后端，
+  其他错误（如 400、401、响应格式错误）直接抛出
+
+后端配置通过环境变量 LLM_BACKENDS（JSON 数组）提供，未配置时使用默认的 ARK 后端。
+SDK 在首次向对应后端发送请求时才导入，不影响应用冷启动。
+"""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+
+# 默认后端配置
+# 未设置 LLM_BACKENDS 时使用，与原先硬编码的 ARK 调用保持一致
+DEFAULT_BACKENDS = [
+    {
+        "name": "ark",
+        "kind": "ark",
+        "model": "doubao-seed-1-6-251015",
+        "api_key_env": "ARK_API_KEY",
+        "params": {"reasoning_effort": "minimal"},  # 控制推理时长，最快推理
+    }
+]
+
+# 路由相关配置
+EWMA_ALPHA = 0.3               # EWMA 平滑系数，越大越偏向最近的样本
+INITIAL_LATENCY = 1.0          # 没有样本时的初始延迟估计（秒），较低的值让新后端有机会被探测
+ERROR_HALF_LIFE = 30.0         # 错误率 EWMA 随时间衰减的半衰期（秒），让故障后端恢复后能重新被选中
+QUOTA_WINDOW = 60.0            # 请求配额的统计窗口（秒）
+ACQUIRE_TIMEOUT = 10.0         # 所有后端都满载时等待空闲槽位的最长时间（秒）
+MAX_ATTEMPTS = 3               # 单个请求最多尝试的次数（含故障转移）
+REQUEST_TIMEOUT = 60.0         # 单次模型请求的默认超时（秒）
+RETRY_BACKOFF = 0.2            # 第一次重试前的退避时间（秒），之后每次翻倍
+RETRY_BACKOFF_MAX = 2.0        # 单次退避的上限（秒）
+
+# 单个 complete() 调用的最长耗时（秒）：每次尝试最多等待槽位 ACQUIRE_TIMEOUT、
+# 请求 REQUEST_TIMEOUT，再加上各次重试前的退避。cache.py 据此设置跨进程计算锁的有效期
+MAX_COMPLETE_DURATION = (
+    MAX_ATTEMPTS * (ACQUIRE_TIMEOUT + REQUEST_TIMEOUT)
+    + sum(min(RETRY_BACKOFF * 2 ** i, RETRY_BACKOFF_MAX) for i in range(MAX_ATTEMPTS - 1))
+)
+
+# 可重试的异常类名（按类名匹配，不需要导入各家 SDK）
+# openai / Ark SDK 的连接错误和超时，以及 httpx 的传输层错误
+RETRYABLE_ERROR_NAMES = {
+    "APIConnectionError", "APITimeoutError",
+    "ArkAPIConnectionError", "ArkAPITimeoutError",
+    "TransportError",
+}
+
+
+def is_retryable(error):
+    """
+    判断请求失败后是否值得重试或转移到其他后端
+
+    - 带 HTTP 状态码的错误：只有 429 和 5xx 可重试
+    - 连接错误和超时可重试
+    - 其他错误（400、401、响应格式错误等）换个后端也不会成功，不重试
+
+    参数：
+        error (Exception): 请求抛出的异常
+
+    返回：
+        bool: 是否可重试
+    """
+    status = getattr(error, "status_code", None)
+    if isinstance(status, int):
+        return status == 429 or status >= 500
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    return any(cls.__name__ in RETRYABLE_ERROR_NAMES for cls in type(error).__mro__)
+
+
+class Backend:
+    """
+    单个模型后端
+
+    记录后端的配置和运行状态，状态的读写由 Router 的锁保护。
+
+    属性：
+        name (str): 后端名称，在注册表中唯一
+        kind (str): 客户端类型，"ark" 或 "openai"
+        model (str): 模型名称
+        base_url (str): API 地址，为空时使用 SDK 默认地址
+        max_concurrency (int): 最大并发请求数，同时也是连接池大小
+        rpm (int): 每分钟请求配额，为空表示不限制
+        cost (float): 相对成本权重，默认 1.0，越低越优先
+        params (dict): 额外传给 chat.completions.create 的参数
+    """
+
+    def __init__(self, name, model, kind="openai", base_url=None, api_key=None,
+                 api_key_env=None, max_concurrency=8, rpm=None, cost=1.0, params=None):
+        if kind not in ("ark", "openai"):
+            raise ValueError(f"不支持的后端类型: {kind}")
+
+        self.name = name
+        self.kind = kind
+        self.model = model
+        self.base_url = base_url
+        self.api_key = api_key
+        self.api_key_env = api_key_env
+        self.max_concurrency = int(max_concurrency)
+        self.rpm = int(rpm) if rpm else None
+        self.cost = float(cost)
+        self.params = dict(params or {})
+
+        # 运行状态
+        self.in_flight = 0                  # 正在进行的请求数
+        self.latency_ewma = None            # 成功请求延迟的 EWMA（秒）
+        self.error_ewma = 0.0               # 错误率的 EWMA（0-1）
+        self._error_updated = 0.0           # error_ewma 最近一次更新的时间
+        self.requests = 0                   # 累计请求数
+        self.errors = 0                     # 累计失败数
+        self._window = deque()              # 配额窗口内的请求时间戳
+
+        # 客户端（延迟初始化）
+        self._client = None
+        self._client_lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        """从配置字典创建后端"""
+        return cls(**config)
+
+    def get_client(self):
+        """
+        获取后端客户端，首次调用时导入 SDK 并创建实例
+
+        每个后端使用独立的 httpx 连接池，池大小与并发上限一致。
+        SDK 自身的重试被关闭，由 Router 统一负责重试和故障转移。
+        """
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    import httpx
+                    http_client = httpx.Client(
+                        limits=httpx.Limits(max_connections=self.max_concurrency,
+                                            max_keepalive_connections=self.max_concurrency)
+                    )
+                    api_key = self.api_key or os.environ.get(self.api_key_env or "")
+                    kwargs = {"api_key": api_key, "max_retries": 0, "http_client": http_client}
+                    if self.base_url:
+                        kwargs["base_url"] = self.base_url
+
+                    if self.kind == "ark":
+                        from volcenginesdkarkruntime import Ark
+                        self._client = Ark(**kwargs)
+                    else:
+                        from openai import OpenAI
+                        self._client = OpenAI(**kwargs)
+        return self._client
+
+    def remaining_quota(self, now):
+        """
+        返回当前配额窗口内剩余的请求数
+
+        未设置 rpm 时返回 None，表示不限制。
+        """
+        if self.rpm is None:
+            return None
+        while self._window and now - self._window[0] >= QUOTA_WINDOW:
+            self._window.popleft()
+        return self.rpm - len(self._window)
+
+    def is_available(self, now):
+        """检查后端是否还有空闲并发槽位和剩余配额"""
+        if self.in_flight >= self.max_concurrency:
+            return False
+        remaining = self.remaining_quota(now)
+        return remaining is None or remaining > 0
+
+    def current_error(self, now):
+        """返回按时间衰减后的错误率 EWMA"""
+        if not self.error_ewma:
+            return 0.0
+        return self.error_ewma * 0.5 ** ((now - self._error_updated) / ERROR_HALF_LIFE)
+
+    def score(self, now):
+        """
+        计算路由得分，得分越低越优先
+
+        得分 = 期望延迟 × 负载系数 × 配额系数 × 成本
+        - 期望延迟：延迟 EWMA 除以成功率，错误率高的后端相当于更慢
+        - 负载系数：正在进行的请求越多越靠后，使流量分散到各后端
+        - 配额系数：剩余配额越少越靠后，避免提前耗尽某一个后端的配额
+        """
+        latency = self.latency_ewma if self.latency_ewma is not None else INITIAL_LATENCY
+        expected_latency = latency / max(1.0 - self.current_error(now), 0.05)
+        load_factor = 1.0 + self.in_flight / self.max_concurrency
+
+        quota_factor = 1.0
+        remaining = self.remaining_quota(now)
+        if remaining is not None:
+            quota_factor = 1.0 / max(remaining / self.rpm, 0.05)
+
+        return expected_latency * load_factor * quota_factor * self.cost
+
+    def record(self, latency, success):
+        """
+        记录一次请求结果，更新 EWMA
+
+        只有成功的请求参与延迟统计，失败的请求只影响错误率。
+        success 为 None 表示请求因调用方的问题失败（如 400、401），
+        只计入请求数和失败数，不影响后端的错误率。
+        """
+        now = time.monotonic()
+        self.requests += 1
+        if success is None:
+            self.errors += 1
+            return
+        error = self.current_error(now)
+        self.error_ewma = error + EWMA_ALPHA * ((0.0 if success else 1.0) - error)
+        self._error_updated = now
+        if success:
+            if self.latency_ewma is None:
+                self.latency_ewma = latency
+            else:
+                self.latency_ewma += EWMA_ALPHA * (latency - self.latency_ewma)
+        else:
+            self.errors += 1
+
+    def stats(self):
+        """返回后端运行状态的快照"""
+        return {
+            "name": self.name,
+            "model": self.model,
+            "in_flight": self.in_flight,
+            "latency_ewma": self.latency_ewma,
+            "error_ewma": round(self.current_error(time.monotonic()), 4),
+            "requests": self.requests,
+            "errors": self.errors,
+            "remaining_quota": self.remaining_quota(time.monotonic()),
+        }
+
+
+class BackendRegistry:
+    """
+    后端注册表
+
+    按名称保存所有已配置的后端。
+    """
+
+    def __init__(self, backends=None):
+        self._backends = {}
+        for backend in backends or []:
+            self.register(backend)
+
+    def register(self, backend):
+        """注册后端，名称重复时抛出 ValueError"""
+        if backend.name in self._backends:
+            raise ValueError(f"后端名称重复: {backend.name}")
+        self._backends[backend.name] = backend
+        return backend
+
+    def get(self, name):
+        """按名称获取后端，不存在时抛出 KeyError"""
+        return self._backends[name]
+
+    def all(self):
+        """返回所有后端的列表"""
+        return list(self._backends.values())
+
+    @classmethod
+    def from_config(cls, configs):
+        """从配置字典列表创建注册表"""
+        return cls([Backend.from_config(config) for config in configs])
+
+    @classmethod
+    def from_env(cls):
+        """
+        从环境变量 LLM_BACKENDS 创建注册表
+
+        LLM_BACKENDS 为 JSON 数组，每个元素是一个后端配置，例如：
+            [{"name": "ark", "kind": "ark", "model": "doubao-seed-1-6-251015",
+              "api_key_env": "ARK_API_KEY", "max_concurrency": 8, "rpm": 600}]
+
+        未设置时使用 DEFAULT_BACKENDS。
+        """
+        raw = os.environ.get("LLM_BACKENDS")
+        configs = json.loads(raw) if raw else DEFAULT_BACKENDS
+        if not configs:
+            raise ValueError("LLM_BACKENDS 至少需要配置一个后端")
+        return cls.from_config(configs)
+
+
+class Router:
+    """
+    延迟感知的后端路由器
+
+    每次请求选择得分最低的可用后端，遇到可重试的错误时退避并转移到下一个后端。
+    所有后端都满载或配额耗尽时，等待空闲槽位直到超时。
+    """
+
+    def __init__(self, registry, max_attempts=MAX_ATTEMPTS, acquire_timeout=ACQUIRE_TIMEOUT):
+        self.registry = registry
+        self.max_attempts = max_attempts
+        self.acquire_timeout = acquire_timeout
+        self._cond = threading.Condition()
+
+    def _acquire(self, exclude):
+        """
+        选择并占用一个后端的并发槽位
+
+        优先选择本次请求尚未失败过的后端；如果这些后端都不可用，
+        再考虑已失败的后端（只有一个后端时也能重试）。
+
+        参数：
+            exclude (set): 本次请求中已失败的后端名称
+
+        返回：
+            Backend: 已占用槽位的后端
+
+        异常：
+            RuntimeError: 超时仍没有可用后端（错误消息包含 rate_limit）
+        """
+        deadline = time.monotonic() + self.acquire_timeout
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                available = [b for b in self.registry.all() if b.is_available(now)]
+                if available:
+                    fresh = [b for b in available if b.name not in exclude]
+                    backend = min(fresh or available, key=lambda b: b.score(now))
+                    backend.in_flight += 1
+                    if backend.rpm is not None:
+                        backend._window.append(now)
+                    return backend
+
+                remaining = deadline - now
+                if remaining <= 0:
+                    raise RuntimeError("所有模型后端均已满载或达到 rate_limit")
+                # 等待其他请求释放槽位；配额窗口按时间滚动，所以最多等待 1 秒后重新检查
+                self._cond.wait(min(remaining, 1.0))
+
+    def _release(self, backend, latency, success):
+        """释放后端槽位并记录请求结果（success 的含义见 Backend.record）"""
+        with self._cond:
+            backend.in_flight -= 1
+            backend.record(latency, success)
+            self._cond.notify()
+
+    def complete(self, messages, **params):
+        """
+        发送对话补全请求并返回响应文本
+
+        只有 is_retryable() 认为可重试的错误才会退避后转移到其他后端，
+        其他错误立即抛出，也不计入后端的错误率。
+
+        参数：
+            messages (list): 对话消息列表
+            **params: 传给 chat.completions.create 的参数（如 temperature、max_tokens），
+                      未指定 timeout 时使用 REQUEST_TIMEOUT
+
+        返回：
+            str: 模型返回的文本内容（已去除首尾空白）
+
+        异常：
+            Exception: 不可重试的错误，或所有尝试都失败时最后一次的异常
+            RuntimeError: 第一次尝试就没有可用后端（错误消息包含 rate_limit）
+        """
+        params.setdefault("timeout", REQUEST_TIMEOUT)
+        failed = set()
+        last_error = None
+
+        for attempt in range(self.max_attempts):
+            if attempt:
+                time.sleep(min(RETRY_BACKOFF * 2 ** (attempt - 1), RETRY_BACKOFF_MAX))
+            try:
+                backend = self._acquire(failed)
+            except RuntimeError:
+                # 重试时等不到槽位，抛出真正导致失败的错误
+                if last_error is not None:
+                    raise last_error
+                raise
+
+            start = time.monotonic()
+            try:
+                response = backend.get_client().chat.completions.create(
+                    model=backend.model,
+                    messages=messages,
+                    **{**backend.params, **params}
+                )
+                text = response.choices[0].message.content.strip()
+            except Exception as e:
+                if not is_retryable(e):
+                    self._release(backend, time.monotonic() - start, None)
+                    raise
+                self._release(backend, time.monotonic() - start, False)
+                failed.add(backend.name)
+                last_error = e
+                continue
+
+            self._release(backend, time.monotonic() - start, True)
+            return text
+
+        raise last_error
+
+    def stats(self):
+        """返回所有后端运行状态的快照"""
+        with self._cond:
+            return [backend.stats() for backend in self.registry.all()]
+
+
+# 全局路由器（延迟初始化）
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_router():
+    """
+    获取全局路由器，首次调用时根据环境变量创建
+
+    返回：
+        Router: 全局路由器实例
+    """
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = Router(BackendRegistry.from_env())
+    return _router
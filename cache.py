@@ -0,0 +1,813 @@
+"""
+推荐结果缓存
+
+为 get_book_recommendations 提供两级缓存，使多个工作进程、多个节点共享推荐结果，
+命中率随总流量而不是单进程流量增长。
+
+主要功能：
+- L1：进程内 LRU 缓存，命中时无需任何 I/O
+- L2：共享缓存，可选本地文件存储（同一台机器上 fork 出的工作进程共享）
+  或 Redis 协议服务（跨节点共享，多个节点按一致性哈希分片）
+- 紧凑的二进制序列化格式，比 JSON 更小、解析更快
+- 防击穿：同一进程内相同 key 只计算一次，跨进程通过 L2 锁只让一个进程调用模型
+- 熔断：Redis 节点连接失败后暂停访问一段时间，避免每个请求都等待连接超时
+
+缓存配置通过环境变量提供：
+- CACHE_BACKEND：memory（默认，仅 L1）、file 或 redis
+- CACHE_DIR：file 模式下的缓存目录，必须属于当前用户且权限为 0700（不存在时自动创建），
+  默认为系统临时目录下按用户区分的 find_books_cache-<uid>
+- CACHE_REDIS_URLS：redis 模式下的服务地址，多个地址用逗号分隔，如 redis://127.0.0.1:6379/0
+- CACHE_TTL：缓存有效期（秒），默认 3600
+"""
+
+import bisect
+import hashlib
+import logging
+import os
+import socket
+import struct
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlparse
+
+from backends import MAX_COMPLETE_DURATION
+
+logger = logging.getLogger(__name__)
+
+# 缓存相关配置
+DEFAULT_TTL = 3600             # 缓存有效期（秒）
+L1_MAX_ENTRIES = 1024          # 进程内缓存的最大条目数
+LOCK_TTL = int(MAX_COMPLETE_DURATION) + 30  # L2 计算锁的有效期（秒），大于路由器单次调用的最长耗时
+LOCK_WAIT = 30.0               # 未拿到锁时等待其他进程写入结果的最长时间（秒）
+LOCK_POLL_INTERVAL = 0.1       # 等待期间轮询 L2 的间隔（秒）
+KEY_PREFIX = "rec:v1:"         # 缓存键前缀，序列化格式或提示词变化时递增版本号
+CIRCUIT_COOLDOWN = 5.0         # Redis 节点连接失败后暂停访问的时间（秒），连续失败时翻倍
+CIRCUIT_COOLDOWN_MAX = 60.0    # 暂停访问时间的上限（秒）
+
+# 二进制序列化格式
+# 魔数(2 字节) + 书籍数量(varint) + 每本书的 5 个字段（varint 长度 + UTF-8 内容）
+SERIAL_MAGIC = b"R1"
+SERIAL_FIELDS = ("title", "author", "reason", "category", "subcategory")
+
+
+# ============================================
+# 缓存键与序列化
+# ============================================
+
+def make_cache_key(mood, categories=None, max_count=None):
+    """
+    生成推荐结果的缓存键
+
+    心情描述会合并空白字符，类别列表会去重排序，
+    保证语义相同的请求在所有进程、节点上得到相同的键。
+
+    参数：
+        mood (str): 用户输入的心情描述
+        categories (list, optional): 类别 ID 列表
+        max_count (int, optional): 推荐数量上限
+
+    返回：
+        str: 带前缀的缓存键
+    """
+    normalized = "\x1f".join([
+        " ".join(str(mood).split()),
+        ",".join(sorted(set(categories or []))),
+        str(max_count or ""),
+    ])
+    return KEY_PREFIX + hashlib.sha256(normalized.encode("utf-8")).hexdigest()[:32]
+
+
+def _write_varint(buf, value):
+    """写入无符号 varint"""
+    while value >= 0x80:
+        buf.append((value & 0x7F) | 0x80)
+        value >>= 7
+    buf.append(value)
+
+
+def _read_varint(data, pos):
+    """读取无符号 varint，返回 (值, 新位置)"""
+    result = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+
+def encode_recommendations(recommendations):
+    """
+    将推荐列表编码为紧凑的二进制格式
+
+    只保存 title、author、reason、category、subcategory 五个字段，其他字段会被丢弃。
+
+    参数：
+        recommendations (list): 推荐书籍列表
+
+    返回：
+        bytes: 编码后的数据
+    """
+    buf = bytearray(SERIAL_MAGIC)
+    _write_varint(buf, len(recommendations))
+    for book in recommendations:
+        for field in SERIAL_FIELDS:
+            value = str(book.get(field) or "").encode("utf-8")
+            _write_varint(buf, len(value))
+            buf += value
+    return bytes(buf)
+
+
+def decode_recommendations(data):
+    """
+    解码 encode_recommendations 生成的数据
+
+    参数：
+        data (bytes): 编码后的数据
+
+    返回：
+        list: 推荐书籍列表
+
+    异常：
+        ValueError: 数据格式不正确时抛出
+    """
+    if data[:len(SERIAL_MAGIC)] != SERIAL_MAGIC:
+        raise ValueError("缓存数据格式不正确")
+
+    try:
+        count, pos = _read_varint(data, len(SERIAL_MAGIC))
+        recommendations = []
+        for _ in range(count):
+            book = {}
+            for field in SERIAL_FIELDS:
+                length, pos = _read_varint(data, pos)
+                end = pos + length
+                if end > len(data):
+                    raise ValueError("缓存数据被截断")
+                book[field] = data[pos:end].decode("utf-8")
+                pos = end
+            recommendations.append(book)
+    except IndexError:
+        raise ValueError("缓存数据被截断")
+    return recommendations
+
+
+# ============================================
+# L1：进程内 LRU 缓存
+# ============================================
+
+class LRUCache:
+    """
+    进程内 LRU 缓存
+
+    保存解码后的对象，带过期时间，超出容量时淘汰最久未使用的条目。
+    """
+
+    def __init__(self, max_entries=L1_MAX_ENTRIES):
+        self._entries = OrderedDict()       # 键 -> (过期时间, 值)
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """读取缓存，不存在或已过期时返回 None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, ttl):
+        """写入缓存"""
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        """删除缓存"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# ============================================
+# L2：共享缓存
+# ============================================
+
+class CacheBackend:
+    """
+    L2 共享缓存接口
+
+    值均为 bytes。add() 是"不存在时才写入"的原子操作，用作跨进程的计算锁；
+    锁的值是持锁方的随机令牌，释放时用 delete_if_equals() 确保只删除自己的锁。
+    实现类在连接失败等情况下应抛出 OSError，由 TieredCache 统一降级处理。
+    """
+
+    def get(self, key):
+        """读取缓存，不存在时返回 None"""
+        raise NotImplementedError
+
+    def set(self, key, value, ttl):
+        """写入缓存"""
+        raise NotImplementedError
+
+    def add(self, key, value, ttl):
+        """键不存在时写入并返回 True，已存在时返回 False"""
+        raise NotImplementedError
+
+    def delete(self, key):
+        """删除缓存"""
+        raise NotImplementedError
+
+    def delete_if_equals(self, key, value):
+        """值等于 value 时删除并返回 True，否则返回 False"""
+        raise NotImplementedError
+
+
+class FileCache(CacheBackend):
+    """
+    本地文件缓存
+
+    每个键保存为一个文件，文件头 8 字节为过期时间。
+    写入时先写临时文件再原子替换，多个进程并发读写也不会读到半截数据。
+    适用于同一台机器上由 gunicorn 等 fork 出的多个工作进程共享缓存。
+
+    缓存目录以 0700 权限创建；已存在的目录必须属于当前用户且不允许其他用户访问，
+    否则抛出 PermissionError，防止其他用户预先创建目录来读取或篡改缓存。
+    """
+
+    # 每写入多少次清理一次过期文件
+    PRUNE_INTERVAL = 256
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        self._check_permissions()
+        self._writes = 0
+
+    def _check_permissions(self):
+        """检查缓存目录属于当前用户且其他用户无权访问"""
+        if not hasattr(os, "getuid"):
+            return
+        st = os.stat(self.directory)
+        if st.st_uid != os.getuid() or st.st_mode & 0o077:
+            raise PermissionError(
+                f"缓存目录 {self.directory} 必须属于当前用户且权限为 0700"
+                f"（当前所有者 {st.st_uid}，权限 {st.st_mode & 0o777:o}）"
+            )
+
+    def _path(self, key):
+        # 键中只有前缀和十六进制摘要，把冒号替换掉以兼容所有文件系统
+        name = key.replace(":", "_")
+        return os.path.join(self.directory, name)
+
+    def _read(self, path):
+        """读取文件，返回 (过期时间, 内容)，文件不存在时返回 None"""
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        if len(data) < 8:
+            return None
+        return struct.unpack("<d", data[:8])[0], data[8:]
+
+    def get(self, key):
+        entry = self._read(self._path(key))
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.time():
+            return None
+        return value
+
+    def set(self, key, value, ttl):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(struct.pack("<d", time.time() + ttl))
+                f.write(value)
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+        self._writes += 1
+        if self._writes % self.PRUNE_INTERVAL == 0:
+            self.prune()
+
+    def add(self, key, value, ttl):
+        path = self._path(key)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(struct.pack("<d", time.time() + ttl))
+                f.write(value)
+            for _ in range(2):
+                # 硬链接在目标已存在时失败，是原子的"不存在时才写入"
+                try:
+                    os.link(tmp_path, path)
+                    return True
+                except FileExistsError:
+                    pass
+                # 已存在但已过期（如持锁进程崩溃），删除后重试一次
+                entry = self._read(path)
+                if entry is not None and entry[0] > time.time():
+                    return False
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            return False
+        finally:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def delete_if_equals(self, key, value):
+        path = self._path(key)
+        entry = self._read(path)
+        if entry is None or entry[1] != value:
+            return False
+        # 读取和删除之间文件只可能被 add() 替换，而 add() 只替换已过期的锁
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def prune(self):
+        """删除所有已过期的缓存文件"""
+        now = time.time()
+        for name in os.listdir(self.directory):
+            if name.startswith(".tmp-"):
+                continue
+            path = os.path.join(self.directory, name)
+            entry = self._read(path)
+            if entry is not None and entry[0] <= now:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+
+class RedisError(OSError):
+    """Redis 服务返回的错误回复（连接本身正常）"""
+
+
+class CircuitOpenError(ConnectionError):
+    """Redis 节点处于熔断状态，本次调用没有发出请求"""
+
+
+class RedisCache(CacheBackend):
+    """
+    Redis 协议缓存客户端
+
+    只实现 GET、SET（EX/NX 选项）、DEL 和 EVAL 几个命令的 RESP 协议，
+    不依赖第三方 redis 包，任何兼容 Redis 协议的服务都可以作为 L2。
+    连接按需创建并放回连接池复用。
+
+    连接失败或超时后，节点进入熔断状态 CIRCUIT_COOLDOWN 秒，期间的调用直接抛出
+    CircuitOpenError 而不再尝试连接；冷却结束后放行请求探测，再次失败时冷却时间翻倍。
+    """
+
+    # 释放锁的脚本：值等于令牌时才删除
+    DELETE_IF_EQUALS_SCRIPT = (
+        'if redis.call("GET", KEYS[1]) == ARGV[1] then '
+        'return redis.call("DEL", KEYS[1]) else return 0 end'
+    )
+
+    def __init__(self, url, timeout=0.5, max_idle=8):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.timeout = timeout
+        self._max_idle = max_idle
+        self._idle = []
+        self._lock = threading.Lock()
+
+        # 熔断状态
+        self._failures = 0                  # 连续连接失败次数
+        self._open_until = 0.0              # 熔断结束时间（time.monotonic）
+
+    def __repr__(self):
+        return f"RedisCache({self.host}:{self.port}/{self.db})"
+
+    def _connect(self):
+        """建立新连接并完成认证和选库"""
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        conn = (sock, sock.makefile("rb"))
+        try:
+            if self.password:
+                self._execute(conn, "AUTH", self.password)
+            if self.db:
+                self._execute(conn, "SELECT", str(self.db))
+        except BaseException:
+            sock.close()
+            raise
+        return conn
+
+    @staticmethod
+    def _encode(args):
+        """把命令编码为 RESP 数组"""
+        out = bytearray(b"*%d\r\n" % len(args))
+        for arg in args:
+            if isinstance(arg, str):
+                arg = arg.encode("utf-8")
+            out += b"$%d\r\n%s\r\n" % (len(arg), arg)
+        return bytes(out)
+
+    @staticmethod
+    def _read_reply(reader):
+        """读取一个 RESP 回复"""
+        line = reader.readline()
+        if not line.endswith(b"\r\n"):
+            raise ConnectionError("Redis 连接已断开")
+        kind, payload = line[:1], line[1:-2]
+        if kind == b"+":
+            return payload.decode("utf-8")
+        if kind == b"-":
+            raise RedisError(f"Redis 错误: {payload.decode('utf-8', 'replace')}")
+        if kind == b":":
+            return int(payload)
+        if kind == b"$":
+            length = int(payload)
+            if length < 0:
+                return None
+            data = reader.read(length + 2)
+            if len(data) != length + 2:
+                raise ConnectionError("Redis 连接已断开")
+            return data[:-2]
+        raise OSError(f"无法识别的 Redis 回复: {line!r}")
+
+    def _execute(self, conn, *args):
+        sock, reader = conn
+        sock.sendall(self._encode(args))
+        return self._read_reply(reader)
+
+    def command(self, *args):
+        """
+        执行一条命令并返回结果
+
+        出错的连接会被关闭而不放回连接池，连接失败时节点进入熔断状态。
+        """
+        with self._lock:
+            if time.monotonic() < self._open_until:
+                raise CircuitOpenError(f"{self!r} 连接失败，暂停访问中")
+            conn = self._idle.pop() if self._idle else None
+
+        try:
+            if conn is None:
+                conn = self._connect()
+            result = self._execute(conn, *args)
+        except BaseException as e:
+            if conn is not None:
+                conn[0].close()
+            if isinstance(e, OSError) and not isinstance(e, RedisError):
+                self._trip()
+            raise
+
+        with self._lock:
+            self._failures = 0
+            if len(self._idle) < self._max_idle:
+                self._idle.append(conn)
+                conn = None
+        if conn is not None:
+            conn[0].close()
+        return result
+
+    def _trip(self):
+        """记录一次连接失败，进入熔断状态并清空连接池"""
+        with self._lock:
+            self._failures += 1
+            cooldown = min(CIRCUIT_COOLDOWN * 2 ** (self._failures - 1), CIRCUIT_COOLDOWN_MAX)
+            self._open_until = time.monotonic() + cooldown
+            idle, self._idle = self._idle, []
+        for sock, _ in idle:
+            sock.close()
+
+    def get(self, key):
+        return self.command("GET", key)
+
+    def set(self, key, value, ttl):
+        self.command("SET", key, value, "EX", str(int(ttl)))
+
+    def add(self, key, value, ttl):
+        return self.command("SET", key, value, "EX", str(int(ttl)), "NX") is not None
+
+    def delete(self, key):
+        self.command("DEL", key)
+
+    def delete_if_equals(self, key, value):
+        try:
+            return self.command("EVAL", self.DELETE_IF_EQUALS_SCRIPT, "1", key, value) == 1
+        except RedisError:
+            # 不支持 EVAL 的兼容服务：先比较再删除，锁过期后被他人重新获取的极端情况下可能误删
+            if self.command("GET", key) != value:
+                return False
+            return self.command("DEL", key) == 1
+
+
+class HashRing:
+    """
+    一致性哈希环
+
+    每个节点映射到环上的多个虚拟节点。增删节点时只有约 1/N 的键需要迁移，
+    所有进程对同一组节点得到相同的映射。
+    """
+
+    def __init__(self, nodes, replicas=100):
+        self._ring = []
+        for node in nodes:
+            for i in range(replicas):
+                self._ring.append((self._hash(f"{node}#{i}"), node))
+        self._ring.sort()
+        self._hashes = [h for h, _ in self._ring]
+
+    @staticmethod
+    def _hash(value):
+        return int.from_bytes(hashlib.md5(value.encode("utf-8")).digest()[:8], "big")
+
+    def get_node(self, key):
+        """返回键所属的节点"""
+        index = bisect.bisect(self._hashes, self._hash(key)) % len(self._ring)
+        return self._ring[index][1]
+
+
+class ShardedCache(CacheBackend):
+    """
+    分片缓存
+
+    按一致性哈希把键分配到多个 L2 节点，总容量和吞吐随节点数增长。
+    """
+
+    def __init__(self, backends):
+        self._backends = {repr(backend): backend for backend in backends}
+        self._ring = HashRing(list(self._backends))
+
+    def _backend(self, key):
+        return self._backends[self._ring.get_node(key)]
+
+    def get(self, key):
+        return self._backend(key).get(key)
+
+    def set(self, key, value, ttl):
+        self._backend(key).set(key, value, ttl)
+
+    def add(self, key, value, ttl):
+        return self._backend(key).add(key, value, ttl)
+
+    def delete(self, key):
+        self._backend(key).delete(key)
+
+    def delete_if_equals(self, key, value):
+        return self._backend(key).delete_if_equals(key, value)
+
+
+# ============================================
+# 两级缓存
+# ============================================
+
+class _Flight:
+    """同一进程内正在计算的请求"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class TieredCache:
+    """
+    两级推荐结果缓存
+
+    查询顺序：L1 → L2 → 计算。
+    - 同一进程内相同 key 的并发请求只有一个会继续往下走，其余等待它的结果
+    - 跨进程时先抢 L2 锁，抢到的进程调用模型，其他进程轮询 L2 等待结果；
+      锁消失但仍没有结果时（持锁进程失败或结果为空）重新抢锁，不必等到超时
+    - L2 不可用时记录日志并降级为只使用 L1，不影响推荐请求
+    """
+
+    def __init__(self, l2=None, ttl=DEFAULT_TTL, l1_max_entries=L1_MAX_ENTRIES,
+                 lock_wait=LOCK_WAIT):
+        self.l1 = LRUCache(l1_max_entries)
+        self.l2 = l2
+        self.ttl = ttl
+        self.lock_wait = lock_wait
+        self._flights = {}
+        self._flights_lock = threading.Lock()
+
+        # 命中统计
+        self.hits_l1 = 0
+        self.hits_l2 = 0
+        self.misses = 0
+
+    @staticmethod
+    def _copy(recommendations):
+        """返回推荐列表的副本，避免调用方修改缓存中的对象"""
+        return [dict(book) for book in recommendations]
+
+    def _l2_call(self, method, *args):
+        """调用 L2，出错时记录日志并返回 None"""
+        try:
+            return getattr(self.l2, method)(*args)
+        except CircuitOpenError as e:
+            logger.debug(f"共享缓存 {method} 跳过: {str(e)}")
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"共享缓存 {method} 失败: {str(e)}")
+            return None
+
+    def _l2_get(self, key):
+        """从 L2 读取并解码，格式错误按未命中处理"""
+        data = self._l2_call("get", key)
+        if data is None:
+            return None
+        try:
+            return decode_recommendations(data)
+        except ValueError:
+            return None
+
+    def get(self, key):
+        """只读查询，不存在时返回 None"""
+        value = self.l1.get(key)
+        if value is None and self.l2 is not None:
+            value = self._l2_get(key)
+            if value is not None:
+                self.l1.set(key, value, self.ttl)
+        return self._copy(value) if value is not None else None
+
+    def get_or_compute(self, key, compute):
+        """
+        查询缓存，未命中时调用 compute() 计算并写入缓存
+
+        参数：
+            key (str): 缓存键（由 make_cache_key 生成）
+            compute (callable): 无参函数，返回推荐列表
+
+        返回：
+            list: 推荐书籍列表的副本
+
+        异常：
+            Exception: compute() 抛出的异常会原样传给所有等待的调用方
+        """
+        value = self.l1.get(key)
+        if value is not None:
+            self.hits_l1 += 1
+            return self._copy(value)
+
+        # 进程内合并相同 key 的并发请求
+        with self._flights_lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self._flights[key] = flight
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return self._copy(flight.value)
+
+        try:
+            flight.value = self._load(key, compute)
+            return self._copy(flight.value)
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._flights_lock:
+                self._flights.pop(key, None)
+            flight.event.set()
+
+    def _load(self, key, compute):
+        """查询 L2，仍未命中时在 L2 锁保护下计算"""
+        if self.l2 is None:
+            self.misses += 1
+            value = compute()
+            if value:
+                self.l1.set(key, value, self.ttl)
+            return value
+
+        value = self._l2_get(key)
+        if value is not None:
+            self.hits_l2 += 1
+            self.l1.set(key, value, self.ttl)
+            return value
+
+        # 锁的值是本次调用的随机令牌，只有持锁方才能释放
+        lock_key = key + ":lock"
+        token = os.urandom(16).hex().encode("ascii")
+        locked = self._l2_call("add", lock_key, token, LOCK_TTL)
+
+        # locked 为 None 表示 L2 出错，直接计算
+        deadline = time.monotonic() + self.lock_wait
+        while locked is False and time.monotonic() < deadline:
+            # 其他进程正在计算，等待它写入结果
+            time.sleep(LOCK_POLL_INTERVAL)
+            value = self._l2_get(key)
+            if value is not None:
+                self.hits_l2 += 1
+                self.l1.set(key, value, self.ttl)
+                return value
+            if self._l2_call("get", lock_key) is None:
+                # 锁已释放但没有结果（持锁进程失败或结果为空），重新抢锁
+                locked = self._l2_call("add", lock_key, token, LOCK_TTL)
+        # 等待超时（持锁进程可能卡住）时自行计算
+
+        self.misses += 1
+        try:
+            value = compute()
+            # 空结果通常是模型输出异常，不写入缓存
+            if value:
+                self.l1.set(key, value, self.ttl)
+                self._l2_call("set", key, encode_recommendations(value), self.ttl)
+            return value
+        finally:
+            if locked:
+                self._l2_call("delete_if_equals", lock_key, token)
+
+    def stats(self):
+        """返回命中统计"""
+        return {
+            "hits_l1": self.hits_l1,
+            "hits_l2": self.hits_l2,
+            "misses": self.misses,
+            "l1_entries": len(self.l1),
+        }
+
+
+def create_cache_from_env():
+    """
+    根据环境变量创建两级缓存
+
+    返回：
+        TieredCache: 缓存实例
+    """
+    ttl = int(os.environ.get("CACHE_TTL", DEFAULT_TTL))
+    kind = os.environ.get("CACHE_BACKEND", "memory").lower()
+
+    if kind == "memory":
+        l2 = None
+    elif kind == "file":
+        directory = os.environ.get("CACHE_DIR") or os.path.join(
+            tempfile.gettempdir(), f"find_books_cache-{os.getuid() if hasattr(os, 'getuid') else 'user'}")
+        try:
+            l2 = FileCache(directory)
+        except PermissionError as e:
+            # 目录不安全时不使用共享缓存，推荐功能不受影响
+            logger.error(f"共享缓存已禁用: {str(e)}")
+            l2 = None
+    elif kind == "redis":
+        urls = [url.strip() for url in os.environ.get("CACHE_REDIS_URLS", "redis://127.0.0.1:6379/0").split(",")
+                if url.strip()]
+        backends = [RedisCache(url) for url in urls]
+        l2 = backends[0] if len(backends) == 1 else ShardedCache(backends)
+    else:
+        raise ValueError(f"不支持的缓存类型: {kind}")
+
+    return TieredCache(l2=l2, ttl=ttl)
+
+
+# 全局缓存（延迟初始化）
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """
+    获取全局缓存，首次调用时根据环境变量创建
+
+    返回：
+        TieredCache: 全局缓存实例
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = create_cache_from_env()
+    return _cache
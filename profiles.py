@@ -0,0 +1,459 @@
+"""
+用户收藏画像
+
+把用户的收藏聚合为画像，用于个性化推荐：自动补充偏好类别、过滤已收藏的书籍，
+并按画像权重重排模型返回的推荐。
+
+主要功能：
+- FavoritesProfile：单个用户的收藏画像，收藏的添加和删除都是增量更新
+- ProfileStore：按 profile_id 保存画像，可保存在进程内存中，
+  也可保存在 cache.py 的共享缓存（L2）中，由所有工作进程、节点共用
+- 收藏数据和画像 ID 的校验
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from recommend_core import CATEGORY_NAME_TO_ID, RECOMMEND_MAX_COUNT
+
+logger = logging.getLogger(__name__)
+
+# 用户画像相关配置
+MAX_PROFILES = 10000          # 内存中最多保留的用户画像数量（LRU 淘汰）
+MAX_PROFILE_FAVORITES = 500   # 单个用户画像最多记录的收藏数量
+PROFILE_TOP_CATEGORIES = 2    # 未手动选择类别时，自动使用的偏好类别数量
+PROFILE_MAX_OVERFETCH = 3     # 为弥补重复书籍最多额外请求的候选数量
+PROFILE_TTL = 30 * 24 * 3600  # 共享缓存中画像的有效期（秒），客户端每次加载页面都会重新同步
+PROFILE_KEY_PREFIX = "profile:v2:"  # 共享缓存中画像的键前缀，序列化格式变化时递增版本号
+PROFILE_LOCK_TTL = 5          # 修改共享画像时锁的有效期（秒）
+PROFILE_LOCK_WAIT = 1.0       # 等待其他进程释放画像锁的最长时间（秒）
+PROFILE_LOCK_POLL_INTERVAL = 0.02  # 等待画像锁期间的轮询间隔（秒）
+PROFILE_ID_MAX_LENGTH = 64    # 画像 ID 的最大长度
+FAVORITE_FIELD_MAX_LENGTH = 200  # 收藏中 id、title、author、category、subcategory 的最大长度
+
+
+def make_book_key(title, author):
+    """
+    生成用于去重的书籍键
+
+    忽略首尾空白、大小写和书名号，使模型返回的"《活着》"与收藏中的"活着"视为同一本书。
+
+    参数：
+        title (str): 书名
+        author (str): 作者
+
+    返回：
+        tuple: (规范化书名, 规范化作者)
+    """
+    title = str(title or '').strip().strip('《》').strip().lower()
+    author = str(author or '').strip().lower()
+    return (title, author)
+
+
+class FavoritesProfile:
+    """
+    用户收藏画像
+
+    将用户的收藏聚合为类别权重、子类别权重和已收藏书籍集合。
+    收藏的添加和删除都是增量更新（O(1)），不需要每次从头重新计算。
+    """
+
+    def __init__(self):
+        self.books = {}                   # 收藏 ID -> (书籍键, 类别, 子类别)
+        self.seen = {}                    # 书籍键 -> 引用计数
+        self.category_weights = {}        # 类别名称 -> 收藏数量
+        self.subcategory_weights = {}     # 子类别名称 -> 收藏数量
+
+    @staticmethod
+    def _increment(counter, key, delta):
+        """按 delta 调整计数，计数归零时删除键"""
+        if not key:
+            return
+        value = counter.get(key, 0) + delta
+        if value > 0:
+            counter[key] = value
+        else:
+            counter.pop(key, None)
+
+    def add(self, book_id, book):
+        """
+        增量添加一本收藏
+
+        参数：
+            book_id (str): 客户端生成的收藏 ID
+            book (dict): 书籍数据，包含 title、author、category、subcategory
+
+        返回：
+            bool: 是否添加成功（重复收藏或超出上限时返回 False）
+        """
+        if book_id in self.books or len(self.books) >= MAX_PROFILE_FAVORITES:
+            return False
+
+        key = make_book_key(book.get('title'), book.get('author'))
+        self._add_entry(book_id, key, str(book.get('category') or ''),
+                        str(book.get('subcategory') or ''))
+        return True
+
+    def _add_entry(self, book_id, key, category, subcategory):
+        """记录一本收藏并更新各项计数"""
+        self.books[book_id] = (key, category, subcategory)
+        self._increment(self.seen, key, 1)
+        self._increment(self.category_weights, category, 1)
+        self._increment(self.subcategory_weights, subcategory, 1)
+
+    def copy(self):
+        """返回画像的副本，修改副本不影响原画像"""
+        clone = FavoritesProfile()
+        clone.books = dict(self.books)
+        clone.seen = dict(self.seen)
+        clone.category_weights = dict(self.category_weights)
+        clone.subcategory_weights = dict(self.subcategory_weights)
+        return clone
+
+    def dump(self, version=''):
+        """
+        序列化为 JSON 字节串，用于保存到共享缓存
+
+        除收藏列表外还保存聚合后的计数，load() 时直接恢复而不需要逐条重放收藏。
+
+        参数：
+            version (str): 画像版本号，随数据一起保存
+        """
+        data = {
+            'version': version,
+            'books': {book_id: [key[0], key[1], category, subcategory]
+                      for book_id, (key, category, subcategory) in self.books.items()},
+            'seen': [[key[0], key[1], count] for key, count in self.seen.items()],
+            'categories': self.category_weights,
+            'subcategories': self.subcategory_weights,
+        }
+        return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+    @classmethod
+    def load(cls, data):
+        """
+        从 dump() 生成的数据恢复画像
+
+        返回：
+            tuple: (版本号, 画像)
+
+        异常：
+            ValueError: 数据格式不正确时抛出
+        """
+        profile = cls()
+        try:
+            data = json.loads(data)
+            profile.books = {book_id: ((title, author), category, subcategory)
+                             for book_id, (title, author, category, subcategory)
+                             in data['books'].items()}
+            profile.seen = {(title, author): count for title, author, count in data['seen']}
+            profile.category_weights = dict(data['categories'])
+            profile.subcategory_weights = dict(data['subcategories'])
+            return str(data['version']), profile
+        except (TypeError, AttributeError, KeyError) as e:
+            raise ValueError(f"画像数据格式不正确: {str(e)}")
+
+    def remove(self, book_id):
+        """
+        增量删除一本收藏
+
+        参数：
+            book_id (str): 客户端生成的收藏 ID
+
+        返回：
+            bool: 是否删除成功（收藏不存在时返回 False）
+        """
+        entry = self.books.pop(book_id, None)
+        if entry is None:
+            return False
+
+        key, category, subcategory = entry
+        self._increment(self.seen, key, -1)
+        self._increment(self.category_weights, category, -1)
+        self._increment(self.subcategory_weights, subcategory, -1)
+        return True
+
+    def is_seen(self, book):
+        """检查书籍是否已在收藏中"""
+        return make_book_key(book.get('title'), book.get('author')) in self.seen
+
+    def top_categories(self, limit=PROFILE_TOP_CATEGORIES):
+        """
+        返回权重最高的类别 ID 列表
+
+        只返回系统支持的类别，用于在用户未手动选择类别时自动补充偏好。
+        """
+        ranked = sorted(self.category_weights.items(), key=lambda item: -item[1])
+        return [CATEGORY_NAME_TO_ID[name] for name, _ in ranked
+                if name in CATEGORY_NAME_TO_ID][:limit]
+
+    def overfetch_count(self):
+        """
+        返回需要向模型额外请求的候选数量
+
+        已收藏的书籍越多，模型返回重复书籍的可能越大，多取几本候选可以在本地过滤后
+        仍然凑满结果，避免因为重复再调用一次模型。
+        """
+        return min(len(self.seen), PROFILE_MAX_OVERFETCH)
+
+    def score(self, book):
+        """
+        计算书籍与画像的匹配得分
+
+        类别命中的权重高于子类别命中，得分越高越靠前。
+        与 add() 一样把类别转换为字符串，模型返回非字符串的类别时也不会出错。
+        """
+        category = str(book.get('category') or '')
+        subcategory = str(book.get('subcategory') or '')
+        return (2 * self.category_weights.get(category, 0)
+                + self.subcategory_weights.get(subcategory, 0))
+
+    def rerank(self, recommendations, limit=RECOMMEND_MAX_COUNT):
+        """
+        过滤已收藏的书籍并按画像得分重新排序
+
+        排序是稳定的，得分相同的书籍保持模型给出的原始顺序。
+        过滤后为空（所有候选都已收藏）时回退到原始结果，保证用户总能看到推荐。
+
+        参数：
+            recommendations (list): 模型返回的推荐列表
+            limit (int): 返回数量上限
+
+        返回：
+            list: 过滤并重排后的推荐列表
+        """
+        candidates = [book for book in recommendations if not self.is_seen(book)]
+        candidates.sort(key=self.score, reverse=True)
+        return candidates[:limit] or recommendations[:limit]
+
+
+class ProfileStore:
+    """
+    用户画像存储
+
+    以客户端生成的 profile_id 为键保存 FavoritesProfile，支持两种存储方式：
+    - 未设置 l2 时保存在进程内存中，使用 LRU 策略限制画像数量，所有操作都在锁内完成。
+      此时画像不在工作进程之间共享，部署多个工作进程时需要会话保持（sticky session）
+      或只运行一个工作进程，否则请求落到其他进程时看不到用户的收藏
+    - 设置 l2（cache.py 中的 CacheBackend）后保存在共享缓存中，所有工作进程、节点共用。
+      画像数据和版本号分两个键保存，每个进程在本地缓存最近用过的画像及其版本号：
+      读取时只需从 L2 取回很短的版本号，版本未变时直接使用本地副本；
+      修改时先获取 L2 锁，在本地副本上增量修改后写回并更新版本号。
+      共享缓存不可用时记录日志，推荐请求按没有画像处理
+
+    推荐请求通过 get() 取得画像快照，之后的偏好类别、候选数量和重排都在快照上本地完成。
+    """
+
+    def __init__(self, max_profiles=MAX_PROFILES, l2=None, ttl=PROFILE_TTL):
+        self._profiles = OrderedDict()      # 内存模式：画像 ID -> 画像
+        self._snapshots = OrderedDict()     # 共享模式：画像 ID -> (版本号, 画像)，画像不会被原地修改
+        self._lock = threading.Lock()
+        self._max_profiles = max_profiles
+        self.l2 = l2
+        self.ttl = ttl
+
+    @staticmethod
+    def _l2_key(profile_id):
+        """共享缓存中的键，profile_id 由客户端生成，哈希后才能安全地用作文件名"""
+        return PROFILE_KEY_PREFIX + hashlib.sha256(profile_id.encode('utf-8')).hexdigest()[:32]
+
+    def _remember(self, entries, profile_id, value):
+        """把画像放入本地 LRU 并淘汰最久未使用的画像（调用方需持有锁）"""
+        entries[profile_id] = value
+        entries.move_to_end(profile_id)
+        while len(entries) > self._max_profiles:
+            entries.popitem(last=False)
+
+    def _l2_load(self, profile_id):
+        """
+        从共享缓存读取画像，版本号与本地副本相同时直接返回本地副本
+
+        返回的画像可能被其他线程同时使用，调用方不能原地修改。
+
+        返回：
+            FavoritesProfile: 画像，不存在时返回 None
+
+        异常：
+            OSError: 共享缓存不可用时抛出
+        """
+        key = self._l2_key(profile_id)
+        version = self.l2.get(key + ':version')
+        if version is None:
+            return None
+        version = version.decode('ascii', 'replace')
+
+        with self._lock:
+            cached = self._snapshots.get(profile_id)
+            if cached is not None and cached[0] == version:
+                self._snapshots.move_to_end(profile_id)
+                return cached[1]
+
+        data = self.l2.get(key)
+        if data is None:
+            return None
+        try:
+            version, profile = FavoritesProfile.load(data)
+        except ValueError:
+            # 数据损坏时按不存在处理，客户端下次同步时会重建
+            return None
+        with self._lock:
+            self._remember(self._snapshots, profile_id, (version, profile))
+        return profile
+
+    def _l2_save(self, profile_id, profile):
+        """
+        把画像写入共享缓存并更新版本号
+
+        先写数据再写版本号，其他进程看到新版本号时一定能读到不旧于它的数据。
+
+        异常：
+            OSError: 共享缓存不可用时抛出
+        """
+        key = self._l2_key(profile_id)
+        version = os.urandom(8).hex()
+        self.l2.set(key, profile.dump(version), self.ttl)
+        self.l2.set(key + ':version', version.encode('ascii'), self.ttl)
+        with self._lock:
+            self._remember(self._snapshots, profile_id, (version, profile))
+
+    def _l2_lock(self, lock_key, token):
+        """获取共享画像的修改锁，等待超时返回 False"""
+        deadline = time.monotonic() + PROFILE_LOCK_WAIT
+        while not self.l2.add(lock_key, token, PROFILE_LOCK_TTL):
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(PROFILE_LOCK_POLL_INTERVAL)
+        return True
+
+    def get(self, profile_id):
+        """
+        返回画像的只读快照，画像不存在时返回 None
+
+        内存模式下返回副本，共享模式下返回本地缓存的不可变副本，
+        调用方可以在锁外任意读取，而不会看到其他请求的并发修改。
+        """
+        if self.l2 is None:
+            with self._lock:
+                profile = self._profiles.get(profile_id)
+                if profile is None:
+                    return None
+                self._profiles.move_to_end(profile_id)
+                return profile.copy()
+
+        try:
+            return self._l2_load(profile_id)
+        except OSError as e:
+            logger.warning(f"读取共享画像失败: {str(e)}")
+            return None
+
+    def _update(self, profile_id, func, create):
+        """
+        对画像执行修改操作 func(profile) 并保存
+
+        参数：
+            profile_id (str): 画像 ID
+            func (callable): 修改画像的函数，返回是否有改动
+            create (bool): 画像不存在时是否创建
+
+        返回：
+            bool: func 的返回值，画像不存在且不创建或共享缓存不可用时返回 False
+        """
+        if self.l2 is None:
+            with self._lock:
+                profile = self._profiles.get(profile_id)
+                if profile is None:
+                    if not create:
+                        return False
+                    profile = FavoritesProfile()
+                    self._remember(self._profiles, profile_id, profile)
+                else:
+                    self._profiles.move_to_end(profile_id)
+                return func(profile)
+
+        lock_key = self._l2_key(profile_id) + ':lock'
+        token = os.urandom(16).hex().encode('ascii')
+        locked = False
+        try:
+            # 等待超时（持锁进程可能已崩溃）时不加锁继续，最坏情况是同一用户的并发修改后写覆盖先写
+            locked = self._l2_lock(lock_key, token)
+            profile = self._l2_load(profile_id)
+            if profile is None:
+                if not create:
+                    return False
+                profile = FavoritesProfile()
+            else:
+                # 本地副本可能正被其他请求读取，在副本上修改
+                profile = profile.copy()
+            changed = func(profile)
+            if changed:
+                self._l2_save(profile_id, profile)
+            return changed
+        except OSError as e:
+            logger.warning(f"修改共享画像失败: {str(e)}")
+            return False
+        finally:
+            if locked:
+                try:
+                    self.l2.delete_if_equals(lock_key, token)
+                except OSError:
+                    pass
+
+    def add_favorite(self, profile_id, book_id, book):
+        """向指定画像增量添加收藏"""
+        return self._update(profile_id, lambda profile: profile.add(book_id, book), create=True)
+
+    def remove_favorite(self, profile_id, book_id):
+        """从指定画像增量删除收藏"""
+        return self._update(profile_id, lambda profile: profile.remove(book_id), create=False)
+
+    def replace(self, profile_id, favorites):
+        """
+        用完整的收藏列表重建画像
+
+        仅在页面加载时调用一次，用于服务端重启后与客户端 localStorage 重新同步。
+        """
+        profile = FavoritesProfile()
+        for fav in favorites:
+            profile.add(fav['id'], fav)
+
+        if self.l2 is None:
+            with self._lock:
+                self._remember(self._profiles, profile_id, profile)
+            return profile
+
+        try:
+            self._l2_save(profile_id, profile)
+        except OSError as e:
+            logger.warning(f"保存共享画像失败: {str(e)}")
+        return profile
+
+
+def is_valid_profile_id(profile_id):
+    """检查画像 ID 是否为长度合法的非空字符串"""
+    return isinstance(profile_id, str) and 0 < len(profile_id) <= PROFILE_ID_MAX_LENGTH
+
+
+def is_valid_favorite(book):
+    """
+    检查收藏数据是否合法
+
+    id、title、author 必须是非空字符串，category、subcategory 可以省略，
+    所有字段都不能超过 FAVORITE_FIELD_MAX_LENGTH，防止超长数据占满画像存储。
+    """
+    if not isinstance(book, dict):
+        return False
+    for key in ('id', 'title', 'author'):
+        value = book.get(key)
+        if not isinstance(value, str) or not 0 < len(value) <= FAVORITE_FIELD_MAX_LENGTH:
+            return False
+    for key in ('category', 'subcategory'):
+        value = book.get(key)
+        if value is not None and (not isinstance(value, str)
+                                  or len(value) > FAVORITE_FIELD_MAX_LENGTH):
+            return False
+    return True
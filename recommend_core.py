@@ -0,0 +1,279 @@
+"""
+推荐核心逻辑
+
+提示词构建、模型响应解析和类别校验，由 app.py 和各测试脚本共用。
+此模块只依赖标准库，可以在没有 Flask 和模型 SDK 的环境中导入，
+便于离线验证和基准测试（见 test_golden.py）。
+"""
+
+import json
+import re
+
+# 书籍类别数据结构
+# 定义系统支持的所有书籍类别及其子类别
+BOOK_CATEGORIES = {
+    "literature": {
+        "id": "literature",
+        "name": "文学类",
+        "subcategories": ["小说", "散文", "诗歌", "经典名著", "当代文学", "外国文学"]
+    },
+    "social_science": {
+        "id": "social_science",
+        "name": "社科类",
+        "subcategories": ["历史", "哲学", "心理学", "社会学", "政治", "经济学"]
+    },
+    "technology": {
+        "id": "technology",
+        "name": "科技类",
+        "subcategories": ["科普", "互联网", "人工智能", "编程技术", "科学史"]
+    },
+    "business": {
+        "id": "business",
+        "name": "商业类",
+        "subcategories": ["管理", "创业", "营销", "投资理财", "职场"]
+    },
+    "lifestyle": {
+        "id": "lifestyle",
+        "name": "生活类",
+        "subcategories": ["健康养生", "美食", "旅行", "家居", "时尚"]
+    },
+    "personal_growth": {
+        "id": "personal_growth",
+        "name": "成长类",
+        "subcategories": ["自我提升", "励志", "学习方法", "时间管理", "沟通技巧"]
+    },
+    "arts": {
+        "id": "arts",
+        "name": "艺术类",
+        "subcategories": ["绘画", "音乐", "摄影", "设计", "电影"]
+    },
+    "children": {
+        "id": "children",
+        "name": "儿童类",
+        "subcategories": ["绘本", "儿童文学", "科普读物", "教育"]
+    },
+    "comics": {
+        "id": "comics",
+        "name": "漫画类",
+        "subcategories": ["国漫", "日漫", "欧美漫画"]
+    },
+    "mystery": {
+        "id": "mystery",
+        "name": "悬疑推理",
+        "subcategories": ["推理小说", "悬疑小说", "犯罪小说"]
+    },
+    "scifi_fantasy": {
+        "id": "scifi_fantasy",
+        "name": "科幻奇幻",
+        "subcategories": ["科幻小说", "奇幻小说", "玄幻小说"]
+    },
+    "romance": {
+        "id": "romance",
+        "name": "言情类",
+        "subcategories": ["现代言情", "古代言情", "都市情感"]
+    }
+}
+
+
+# 类别名称到类别 ID 的反向索引
+# 模型返回的是类别名称（如：文学类），画像需要映射回类别 ID
+CATEGORY_NAME_TO_ID = {cat["name"]: cat_id for cat_id, cat in BOOK_CATEGORIES.items()}
+
+# 推荐数量配置
+RECOMMEND_MAX_COUNT = 5       # 最终返回给用户的推荐数量上限
+MAX_TOKENS_PER_BOOK = 300     # 每本推荐书籍预留的输出 token 数（5 本共 1500）
+
+# system 消息：定义 AI 助手的角色和行为
+SYSTEM_PROMPT = "你是一位专业的图书推荐专家，擅长根据用户心情推荐合适的书籍。"
+
+
+# 提示词中的推荐要求和格式说明
+# 与心情无关的部分在导入时生成一次，类别列表直接来自 BOOK_CATEGORIES，保证两者一致
+PROMPT_REQUIREMENTS = """对于每本书，请提供：
+1. 书名
+2. 作者
+3. 推荐理由（说明为什么这本书适合用户当前的心情）
+4. 书籍类别（从以下类别中选择）
+5. 书籍子类别（可选）
+
+可用的书籍类别：
+""" + "\n".join(
+    f"- {cat['name']}：{'、'.join(cat['subcategories'])}" for cat in BOOK_CATEGORIES.values()
+) + """
+
+请以 JSON 格式返回推荐结果，格式如下：
+[
+  {
+    "title": "书名",
+    "author": "作者",
+    "reason": "推荐理由",
+    "category": "类别名称（如：文学类）",
+    "subcategory": "子类别（如：小说）"
+  }
+]
+
+只返回 JSON 数组，不要包含其他文字说明。"""
+
+# 从带说明文字的响应中提取 JSON 数组的正则表达式
+JSON_ARRAY_PATTERN = re.compile(r'\[.*\]', re.DOTALL)
+
+
+def build_prompt(mood, categories=None, max_count=RECOMMEND_MAX_COUNT):
+    """
+    构建推荐提示词，根据用户心情和类别偏好生成合适的 prompt
+
+    此函数将用户的心情描述和可选的类别偏好转换为结构化的提示词，
+    指导 GPT 模型生成符合要求的书籍推荐结果。
+
+    参数：
+        mood (str): 用户输入的心情描述
+        categories (list, optional): 用户选择的类别 ID 列表
+        max_count (int, optional): 推荐数量上限，默认 5 本；
+            用户已有收藏时会适当增加，以便本地过滤重复书籍
+
+    返回：
+        str: 格式化的提示词，包含推荐要求和输出格式说明
+
+    示例：
+        >>> build_prompt("开心", ["literature", "arts"])
+        "你是一位专业的图书推荐专家。用户当前的心情是：开心..."
+    """
+    # 基础提示词
+    prompt = f"""你是一位专业的图书推荐专家。用户当前的心情是：{mood}"""
+
+    # 如果用户指定了类别偏好，添加到提示词中
+    if categories:
+        category_names = [BOOK_CATEGORIES[cat]["name"] for cat in categories]
+        prompt += f"\n\n用户偏好的书籍类别：{', '.join(category_names)}"
+        prompt += "\n请优先推荐这些类别的书籍。"
+
+    # 添加推荐数量要求
+    prompt += f"\n\n请根据用户的心情推荐 3-{max_count} 本适合的书籍。"
+
+    # 添加推荐要求和格式说明
+    prompt += PROMPT_REQUIREMENTS
+    return prompt
+
+
+def max_tokens_for(max_count=RECOMMEND_MAX_COUNT):
+    """
+    返回请求 max_count 本书时的 max_tokens
+
+    输出长度与书籍数量成正比，为画像多请求的候选同样预留空间，
+    避免响应被截断后无法解析。
+
+    参数：
+        max_count (int): 推荐数量上限
+
+    返回：
+        int: max_tokens 参数值
+    """
+    return max_count * MAX_TOKENS_PER_BOOK
+
+
+def parse_response(response_text):
+    """
+    解析 API 响应，提取书名、作者、推荐理由和类别信息
+
+    此函数负责将 OpenAI API 返回的文本响应解析为结构化的数据。
+    支持直接 JSON 解析和从文本中提取 JSON 的容错处理。
+
+    参数：
+        response_text (str): OpenAI API 返回的原始文本响应
+
+    返回：
+        list: 包含推荐书籍的列表，每个元素是一个字典，包含：
+            - title (str): 书名
+            - author (str): 作者
+            - reason (str): 推荐理由
+            - category (str): 书籍类别
+            - subcategory (str, optional): 书籍子类别
+
+    异常：
+        ValueError: 当响应格式不正确或缺少必需字段时抛出
+
+    示例：
+        >>> parse_response('[{"title":"书名","author":"作者","reason":"理由","category":"文学类","subcategory":"小说"}]')
+        [{'title': '书名', 'author': '作者', 'reason': '理由', 'category': '文学类', 'subcategory': '小说'}]
+    """
+    try:
+        # 尝试直接解析 JSON
+        # 大多数情况下，GPT 会直接返回有效的 JSON 格式
+        recommendations = json.loads(response_text)
+
+        # 验证数据结构
+        # 确保返回的是列表类型
+        if not isinstance(recommendations, list):
+            raise ValueError("响应格式不正确")
+
+        return _validate_recommendations(recommendations)
+    except json.JSONDecodeError:
+        # 如果直接解析失败，尝试从文本中提取 JSON 部分
+        # 这是一个容错机制，处理 GPT 可能在 JSON 前后添加说明文字或代码块标记的情况
+        json_match = JSON_ARRAY_PATTERN.search(response_text)
+        if json_match:
+            try:
+                # 对提取的 JSON 也进行字段验证和补充
+                return _validate_recommendations(json.loads(json_match.group()))
+            except ValueError:
+                pass
+        raise ValueError("无法解析 API 响应")
+
+
+def _validate_recommendations(recommendations):
+    """
+    验证推荐列表的字段完整性，并补充可选字段的默认值
+
+    参数：
+        recommendations (list): 解析出的推荐列表
+
+    返回：
+        list: 原列表（已就地补充 category 和 subcategory）
+
+    异常：
+        ValueError: 不是列表，或某个推荐缺少 title、author、reason 时抛出
+    """
+    if not isinstance(recommendations, list):
+        raise ValueError("响应格式不正确")
+
+    # 确保每个推荐都有必需的字段
+    # 验证数据完整性，防止缺少关键信息
+    for rec in recommendations:
+        # 检查基本必需字段
+        if not isinstance(rec, dict) or not all(key in rec for key in ('title', 'author', 'reason')):
+            raise ValueError("推荐数据缺少必需字段")
+
+        # 检查类别字段，如果缺少则设置默认值
+        if 'category' not in rec:
+            rec['category'] = '其他'
+
+        # subcategory 是可选字段，如果不存在则设置为空字符串
+        if 'subcategory' not in rec:
+            rec['subcategory'] = ''
+
+    return recommendations
+
+
+def validate_categories(categories):
+    """
+    校验请求中的类别参数
+
+    参数：
+        categories: 请求中的 categories 字段（可以为 None）
+
+    返回：
+        str: 错误信息，参数合法时返回 None
+    """
+    if categories is None:
+        return None
+
+    # 确保 categories 是列表类型
+    if not isinstance(categories, list):
+        return 'categories 参数必须是数组'
+
+    # 验证每个类别 ID 是否有效
+    for category_id in categories:
+        if not isinstance(category_id, str) or category_id not in BOOK_CATEGORIES:
+            return f'无效的类别 ID: {category_id}'
+
+    return None
@@ -275,7 +275,13 @@ const FavoritesManager = {
         favorites.push(favoriteBook);
 
         // 保存到 localStorage
-        return this._saveToStorage(favorites);
+        const saved = this._saveToStorage(favorites);
+
+        // 同步到服务端画像（增量更新）
+        if (saved) {
+            ProfileSync.addFavorite(favoriteBook);
+        }
+        return saved;
     },
 
     /**
@@ -304,7 +310,13 @@ const FavoritesManager = {
         favorites.splice(index, 1);
 
         // 保存到 localStorage
-        return this._saveToStorage(favorites);
+        const saved = this._saveToStorage(favorites);
+
+        // 同步到服务端画像（增量更新）
+        if (saved) {
+            ProfileSync.removeFavorite(bookId);
+        }
+        return saved;
     },
 
     /**
@@ -370,6 +382,116 @@ const FavoritesManager = {
     }
 };
 
+/**
+ * ProfileSync - 服务端画像同步器
+ *
+ * 将收藏同步到服务端的用户画像，服务端据此：
+ * - 在未选择类别时自动补充偏好类别
+ * - 过滤已收藏的书籍并重新排序推荐结果
+ *
+ * 同步失败不影响收藏功能本身，只会让推荐失去个性化效果
+ */
+const ProfileSync = {
+    // localStorage 存储键名
+    STORAGE_KEY: 'bookProfileId',
+
+    // 同步到服务端的最大收藏数量（与服务端的 MAX_PROFILE_FAVORITES 一致）
+    MAX_FAVORITES: 500,
+
+    // 内存中的画像 ID
+    _profileId: null,
+
+    /**
+     * 获取当前用户的画像 ID，不存在时生成一个新的
+     *
+     * @returns {string} 画像 ID
+     */
+    getProfileId() {
+        if (this._profileId) {
+            return this._profileId;
+        }
+
+        let profileId = null;
+        if (isLocalStorageAvailable()) {
+            profileId = localStorage.getItem(this.STORAGE_KEY);
+        }
+
+        if (!profileId) {
+            // 生成随机 ID（去掉非字母数字字符，保证 URL 安全）
+            const random = (window.crypto && crypto.randomUUID)
+                ? crypto.randomUUID()
+                : `${Date.now()}${Math.random()}`;
+            profileId = random.replace(/[^a-zA-Z0-9]/g, '').substring(0, 32);
+            if (isLocalStorageAvailable()) {
+                localStorage.setItem(this.STORAGE_KEY, profileId);
+            }
+        }
+
+        this._profileId = profileId;
+        return profileId;
+    },
+
+    /**
+     * 发送同步请求，失败时仅记录日志
+     *
+     * @param {string} path - 画像下的子路径
+     * @param {Object} options - fetch 选项
+     * @private
+     */
+    _send(path, options) {
+        const url = `/api/profile/${encodeURIComponent(this.getProfileId())}${path}`;
+        fetch(url, options).catch(error => {
+            console.warn('同步收藏画像失败:', error);
+        });
+    },
+
+    /**
+     * 用完整的收藏列表重建服务端画像
+     *
+     * 只发送最近的 MAX_FAVORITES 本收藏，并且只包含画像用到的字段
+     *
+     * @param {Array} favorites - 收藏书籍数组（按收藏时间倒序）
+     */
+    syncAll(favorites) {
+        const payload = favorites.slice(0, this.MAX_FAVORITES).map(fav => ({
+            id: fav.id,
+            title: fav.title,
+            author: fav.author,
+            category: fav.category,
+            subcategory: fav.subcategory,
+        }));
+        this._send('/sync', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ favorites: payload }),
+        });
+    },
+
+    /**
+     * 增量添加收藏
+     *
+     * @param {Object} favorite - 收藏对象
+     */
+    addFavorite(favorite) {
+        this._send('/favorites', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify(favorite),
+        });
+    },
+
+    /**
+     * 增量删除收藏
+     *
+     * @param {string} bookId - 书籍 ID
+     */
+    removeFavorite(bookId) {
+        this._send(`/favorites/${encodeURIComponent(bookId)}`, {
+            method: 'DELETE',
+        });
+    }
+};
+
 // ============================================
 // 页面初始化
 // ============================================
@@ -419,6 +541,9 @@ function initializeFavorites() {
     const favorites = FavoritesManager.getAllFavorites();
 
     console.log(`已加载 ${favorites.length} 个收藏`);
+
+    // 将收藏同步到服务端画像，用于个性化推荐
+    ProfileSync.syncAll(favorites);
 }
 
 /**
@@ -622,7 +747,8 @@ async function getRecommendations(mood) {
         const selectedCategories = getSelectedCategories();
 
         // 构建请求体
-        const requestBody = { mood: mood };
+        // 附带画像 ID，服务端据此过滤已收藏书籍并个性化排序
+        const requestBody = { mood: mood, profile_id: ProfileSync.getProfileId() };
         if (selectedCategories.length > 0) {
             requestBody.categories = selectedCategories;
         }
@@ -1,84 +1,96 @@
 """
 简单的 OpenAI API 验证脚本
 
-用于测试火山引擎 ARK API 连接是否正常
+用于测试 backends.py 中配置的每个模型后端（默认为火山引擎 ARK API）连接是否正常
 """
 
 import os
 from dotenv import load_dotenv
-from volcenginesdkarkruntime import Ark
+
+from backends import BackendRegistry
 
 # 加载环境变量
 load_dotenv()
 
-def test_api_connection():
-    """测试 API 连接"""
-    print("=" * 60)
-    print("火山引擎 ARK API 连接测试")
-    print("=" * 60)
-    print()
+def check_backend_connection(backend):
+    """测试单个后端的连接"""
+    print(f"[{backend.name}] 模型: {backend.model}")
 
     # 检查 API 密钥
-    api_key = os.environ.get("ARK_API_KEY")
+    api_key = backend.api_key or os.environ.get(backend.api_key_env or "")
     if not api_key:
-        print("❌ 错误: 未找到 ARK_API_KEY 环境变量")
-        print("请在 .env 文件中设置 ARK_API_KEY")
+        print(f"❌ 错误: 未找到 {backend.api_key_env} 环境变量")
+        print(f"请在 .env 文件中设置 {backend.api_key_env}")
         return False
 
     print(f"✓ API 密钥已加载 (长度: {len(api_key)})")
-    print()
 
     try:
         # 初始化客户端
-        print("正在初始化 Ark 客户端...")
-        client = Ark(api_key=api_key)
+        print("正在初始化客户端...")
+        client = backend.get_client()
         print("✓ 客户端初始化成功")
-        print()
 
         # 发送测试请求
         print("正在发送测试请求...")
         response = client.chat.completions.create(
-            model="doubao-seed-1-6-251015",
+            model=backend.model,
             messages=[
                 {"role": "system", "content": "你是一个有帮助的助手。"},
                 {"role": "user", "content": "请用一句话介绍你自己。"}
             ],
-            reasoning_effort = "minimal",
-            temperature=0.7,
-            max_tokens=100
+            **{**backend.params, "temperature": 0.7, "max_tokens": 100}
         )
 
         # 提取响应
         ai_response = response.choices[0].message.content
         print("✓ API 调用成功!")
-        print()
         print("-" * 60)
         print("AI 响应:")
         print(ai_response)
         print("-" * 60)
         print()
-
-        print("=" * 60)
-        print("✅ 测试通过! API 连接正常")
-        print("=" * 60)
         return True
 
     except Exception as e:
-        print()
-        print("=" * 60)
-        print("❌ 测试失败!")
-        print("=" * 60)
-        print(f"错误信息: {str(e)}")
+        print(f"❌ 测试失败: {str(e)}")
         print()
         print("可能的原因:")
         print("1. API 密钥无效或已过期")
         print("2. 网络连接问题")
         print("3. API 服务暂时不可用")
-        print("4. 模型名称不正确")
+        print("4. 模型名称或 base_url 不正确")
         print()
         return False
 
 
+def test_api_connection():
+    """测试所有后端的 API 连接"""
+    print("=" * 60)
+    print("模型后端 API 连接测试")
+    print("=" * 60)
+    print()
+
+    try:
+        registry = BackendRegistry.from_env()
+    except Exception as e:
+        print(f"❌ 错误: 后端配置无效 ({str(e)})")
+        print("请检查 LLM_BACKENDS 环境变量")
+        return False
+
+    # 逐个测试，单个后端失败不影响其他后端的测试
+    results = [check_backend_connection(backend) for backend in registry.all()]
+    passed = sum(results)
+
+    print("=" * 60)
+    if passed == len(results):
+        print(f"✅ 测试通过! {passed} 个后端连接正常")
+    else:
+        print(f"❌ 测试失败! {len(results) - passed}/{len(results)} 个后端连接异常")
+    print("=" * 60)
+    return passed == len(results)
+
+
 if __name__ == '__main__':
     success = test_api_connection()
     exit(0 if success else 1)
@@ -0,0 +1,490 @@
+"""
+推荐结果缓存测试脚本
+
+验证 cache.py 的序列化、防击穿、跨进程共享和一致性哈希，
+Redis 部分使用本地模拟的 Redis 协议服务，无需安装 Redis。
+"""
+
+import json
+import multiprocessing
+import os
+import socket
+import socketserver
+import tempfile
+import threading
+import time
+
+from cache import (FileCache, HashRing, RedisCache, ShardedCache, TieredCache,
+                   create_cache_from_env, decode_recommendations, encode_recommendations,
+                   make_cache_key)
+
+# 测试用推荐数据
+SAMPLE_RECOMMENDATIONS = [
+    {"title": "活着", "author": "余华", "reason": "在困境中感受生命的韧性", "category": "文学类", "subcategory": "小说"},
+    {"title": "人类简史", "author": "尤瓦尔·赫拉利", "reason": "换个视角看待眼前的烦恼", "category": "社科类", "subcategory": "历史"},
+    {"title": "三体", "author": "刘慈欣", "reason": "宏大的想象力让人暂时忘记压力", "category": "科幻奇幻", "subcategory": "科幻小说"},
+]
+
+
+class MockRedisHandler(socketserver.StreamRequestHandler):
+    """
+    模拟的 Redis 协议服务，只支持 GET、SET（EX/NX）、DEL，
+    以及 RedisCache 释放锁时使用的 EVAL 脚本（按比较后删除的语义执行）
+    """
+
+    def _read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        args = []
+        for _ in range(int(line[1:-2])):
+            length = int(self.rfile.readline()[1:-2])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    def handle(self):
+        store = self.server.store
+        lock = self.server.lock
+        while True:
+            args = self._read_command()
+            if args is None:
+                return
+            command = args[0].upper()
+            with lock:
+                now = time.time()
+                if command == b"GET":
+                    entry = store.get(args[1])
+                    if entry is None or entry[0] <= now:
+                        reply = b"$-1\r\n"
+                    else:
+                        reply = b"$%d\r\n%s\r\n" % (len(entry[1]), entry[1])
+                elif command == b"SET":
+                    options = [arg.upper() for arg in args[3:]]
+                    ttl = int(args[4]) if b"EX" in options else 10 ** 9
+                    entry = store.get(args[1])
+                    if b"NX" in options and entry is not None and entry[0] > now:
+                        reply = b"$-1\r\n"
+                    else:
+                        store[args[1]] = (now + ttl, args[2])
+                        reply = b"+OK\r\n"
+                elif command == b"DEL":
+                    reply = b":%d\r\n" % (1 if store.pop(args[1], None) else 0)
+                elif command == b"EVAL" and self.server.eval_supported:
+                    entry = store.get(args[3])
+                    deleted = entry is not None and entry[0] > now and entry[1] == args[4]
+                    if deleted:
+                        del store[args[3]]
+                    reply = b":%d\r\n" % deleted
+                else:
+                    reply = b"-ERR unknown command\r\n"
+            self.wfile.write(reply)
+
+
+class MockRedisServer(socketserver.ThreadingTCPServer):
+    """在随机端口上启动的模拟 Redis 服务"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, eval_supported=True):
+        super().__init__(("127.0.0.1", 0), MockRedisHandler)
+        self.eval_supported = eval_supported
+        self.store = {}
+        self.lock = threading.Lock()
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def url(self):
+        return f"redis://127.0.0.1:{self.server_address[1]}/0"
+
+
+def slow_compute(counter, delay=0.2):
+    """模拟模型调用：记录调用次数并返回样例推荐"""
+    def compute():
+        counter.append(1)
+        time.sleep(delay)
+        return SAMPLE_RECOMMENDATIONS
+    return compute
+
+
+def run_concurrently(func, count):
+    """用多个线程同时调用 func(线程序号)，返回结果列表"""
+    results = [None] * count
+
+    def worker(i):
+        results[i] = func(i)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def check_serialization():
+    """测试二进制序列化的正确性和体积"""
+    print("[序列化]")
+    data = encode_recommendations(SAMPLE_RECOMMENDATIONS)
+    json_size = len(json.dumps(SAMPLE_RECOMMENDATIONS, ensure_ascii=False).encode("utf-8"))
+    print(f"   二进制: {len(data)} 字节，JSON: {json_size} 字节")
+
+    if decode_recommendations(data) != SAMPLE_RECOMMENDATIONS:
+        print("❌ 解码结果与原始数据不一致")
+        return False
+    try:
+        decode_recommendations(data[:-5])
+        print("❌ 截断的数据没有被识别")
+        return False
+    except ValueError:
+        pass
+    if len(data) >= json_size:
+        print("❌ 二进制格式没有比 JSON 更紧凑")
+        return False
+
+    key = make_cache_key("  开心 快乐 ", ["arts", "literature", "arts"], 5)
+    if key != make_cache_key("开心 快乐", ["literature", "arts"], 5):
+        print("❌ 语义相同的请求生成了不同的缓存键")
+        return False
+
+    print("✓ 通过")
+    return True
+
+
+def check_single_flight():
+    """测试同一进程内相同 key 的并发请求只计算一次"""
+    print("[进程内防击穿]")
+    cache = TieredCache()
+    calls = []
+    key = make_cache_key("焦虑")
+    results = run_concurrently(lambda i: cache.get_or_compute(key, slow_compute(calls)), 8)
+
+    print(f"   8 个并发请求，模型调用 {len(calls)} 次")
+    if len(calls) != 1 or any(result != SAMPLE_RECOMMENDATIONS for result in results):
+        print("❌ 并发请求没有合并")
+        return False
+
+    print("✓ 通过")
+    return True
+
+
+def _file_worker(directory, counter_path, key, start_at):
+    """子进程：使用共享的文件缓存获取推荐"""
+    cache = TieredCache(l2=FileCache(directory))
+
+    def compute():
+        with open(counter_path, "a") as f:
+            f.write("1\n")
+        time.sleep(0.3)
+        return SAMPLE_RECOMMENDATIONS
+
+    # 所有子进程同时开始，制造跨进程的并发未命中
+    time.sleep(max(start_at - time.time(), 0))
+    result = cache.get_or_compute(key, compute)
+    os._exit(0 if result == SAMPLE_RECOMMENDATIONS else 1)
+
+
+def check_file_cache_across_processes():
+    """测试 fork 出的多个工作进程共享文件缓存"""
+    print("[文件缓存跨进程共享]")
+    if "fork" not in multiprocessing.get_all_start_methods():
+        print("   当前平台不支持 fork，跳过")
+        return True
+
+    context = multiprocessing.get_context("fork")
+    with tempfile.TemporaryDirectory() as directory:
+        counter_path = os.path.join(directory, "calls.txt")
+        cache_dir = os.path.join(directory, "cache")
+        key = make_cache_key("疲惫")
+        start_at = time.time() + 0.3
+
+        processes = [context.Process(target=_file_worker, args=(cache_dir, counter_path, key, start_at))
+                     for _ in range(4)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+
+        with open(counter_path) as f:
+            calls = len(f.readlines())
+        print(f"   4 个工作进程，模型调用 {calls} 次")
+
+        if any(process.exitcode != 0 for process in processes) or calls != 1:
+            print("❌ 工作进程之间没有共享结果")
+            return False
+
+        # 新进程（新的 L1）直接命中 L2
+        cache = TieredCache(l2=FileCache(cache_dir))
+        if cache.get(key) != SAMPLE_RECOMMENDATIONS:
+            print("❌ 新进程没有命中共享缓存")
+            return False
+
+    print("✓ 通过")
+    return True
+
+
+def check_redis_sharded():
+    """测试多个节点的 Redis 协议缓存分片和跨实例防击穿"""
+    print("[Redis 协议分片缓存]")
+    servers = [MockRedisServer(), MockRedisServer()]
+    try:
+        def make_cache():
+            return TieredCache(l2=ShardedCache([RedisCache(server.url) for server in servers]))
+
+        # 两个缓存实例模拟两个节点上的工作进程
+        calls = []
+        key = make_cache_key("平静", ["literature"], 5)
+        worker_a, worker_b = make_cache(), make_cache()
+        workers = [worker_a, worker_b]
+        results = run_concurrently(lambda i: workers[i % 2].get_or_compute(key, slow_compute(calls)), 8)
+        print(f"   8 个并发请求分布在 2 个实例上，模型调用 {len(calls)} 次")
+        if len(calls) != 1 or any(result != SAMPLE_RECOMMENDATIONS for result in results):
+            print("❌ 实例之间没有共享结果")
+            return False
+
+        # 多个键应当分布到两个节点上
+        for i in range(50):
+            worker_a.l2.set(make_cache_key(f"心情{i}"), b"x", 60)
+        sizes = [len(server.store) for server in servers]
+        print(f"   50 个键在 2 个节点上的分布: {sizes}")
+        if min(sizes) == 0:
+            print("❌ 键没有分散到多个节点")
+            return False
+    finally:
+        for server in servers:
+            server.shutdown()
+            server.server_close()
+
+    print("✓ 通过")
+    return True
+
+
+def check_hash_ring_consistency():
+    """测试增加节点时只有少量键需要迁移"""
+    print("[一致性哈希]")
+    keys = [make_cache_key(f"心情{i}") for i in range(2000)]
+    before = HashRing(["node-a", "node-b", "node-c"])
+    after = HashRing(["node-a", "node-b", "node-c", "node-d"])
+    moved = sum(before.get_node(key) != after.get_node(key) for key in keys) / len(keys)
+
+    print(f"   3 个节点扩容到 4 个，迁移比例 {moved:.1%}（理想值 25%）")
+    if moved > 0.4:
+        print("❌ 迁移的键过多")
+        return False
+
+    print("✓ 通过")
+    return True
+
+
+def check_l2_unavailable():
+    """测试 L2 不可用时降级为只使用 L1，并通过熔断避免反复等待超时"""
+    print("[L2 不可用降级]")
+    # 端口 1 上没有服务，连接会立即失败
+    cache = TieredCache(l2=RedisCache("redis://127.0.0.1:1/0", timeout=0.2))
+    calls = []
+    key = make_cache_key("无聊")
+    first = cache.get_or_compute(key, slow_compute(calls, delay=0))
+    second = cache.get_or_compute(key, slow_compute(calls, delay=0))
+
+    if first != SAMPLE_RECOMMENDATIONS or second != SAMPLE_RECOMMENDATIONS or len(calls) != 1:
+        print("❌ L2 不可用时推荐失败或 L1 没有生效")
+        return False
+
+    # 只监听不应答的端口：连接能建立，但每条命令都要等到超时
+    silent = socket.socket()
+    silent.bind(("127.0.0.1", 0))
+    silent.listen(8)
+    try:
+        port = silent.getsockname()[1]
+        cache = TieredCache(l2=RedisCache(f"redis://127.0.0.1:{port}/0", timeout=0.2))
+        start = time.monotonic()
+        for i in range(5):
+            cache.get_or_compute(make_cache_key(f"无聊{i}"), slow_compute([], delay=0))
+        elapsed = time.monotonic() - start
+    finally:
+        silent.close()
+
+    print(f"   L2 无响应时 5 次未命中耗时 {elapsed:.2f} 秒")
+    if elapsed > 0.6:
+        print("❌ 连接超时后没有熔断，每次请求都在等待 L2")
+        return False
+
+    print("✓ 通过")
+    return True
+
+
+def check_lock_ownership():
+    """测试只有持有令牌的一方才能释放锁"""
+    print("[锁令牌]")
+    servers = [MockRedisServer(), MockRedisServer(eval_supported=False)]
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            backends = [FileCache(os.path.join(directory, "cache"))]
+            backends += [RedisCache(server.url) for server in servers]
+            for backend in backends:
+                backend.add("rec:v1:test:lock", b"token-a", 60)
+                if backend.delete_if_equals("rec:v1:test:lock", b"token-b"):
+                    print(f"❌ {backend!r} 删除了其他持有者的锁")
+                    return False
+                if backend.get("rec:v1:test:lock") != b"token-a":
+                    print(f"❌ {backend!r} 的锁被错误删除")
+                    return False
+                if not backend.delete_if_equals("rec:v1:test:lock", b"token-a"):
+                    print(f"❌ {backend!r} 持有者无法释放自己的锁")
+                    return False
+                if backend.get("rec:v1:test:lock") is not None:
+                    print(f"❌ {backend!r} 的锁没有被删除")
+                    return False
+    finally:
+        for server in servers:
+            server.shutdown()
+            server.server_close()
+
+    print("✓ 通过")
+    return True
+
+
+def check_lock_released_without_value():
+    """测试持锁方结果为空时，等待方在锁释放后立即接手，而不是等到超时"""
+    print("[锁释放后接手]")
+    with tempfile.TemporaryDirectory() as directory:
+        l2 = FileCache(os.path.join(directory, "cache"))
+        holder = TieredCache(l2=l2, lock_wait=10)
+        waiter = TieredCache(l2=l2, lock_wait=10)
+        key = make_cache_key("迷茫")
+
+        def empty_compute():
+            time.sleep(0.3)
+            return []
+
+        def worker(i):
+            if i == 0:
+                return holder.get_or_compute(key, empty_compute)
+            time.sleep(0.05)
+            start = time.monotonic()
+            result = waiter.get_or_compute(key, slow_compute([], delay=0))
+            return result, time.monotonic() - start
+
+        _, (result, elapsed) = run_concurrently(worker, 2)
+
+    print(f"   持锁方返回空结果，等待方 {elapsed:.2f} 秒后拿到推荐")
+    if result != SAMPLE_RECOMMENDATIONS or elapsed > 2:
+        print("❌ 等待方没有在锁释放后接手计算")
+        return False
+
+    print("✓ 通过")
+    return True
+
+
+def check_cache_dir_permissions():
+    """测试缓存目录以 0700 创建，并拒绝其他用户可访问的已有目录"""
+    print("[缓存目录权限]")
+    if not hasattr(os, "getuid"):
+        print("   当前平台不支持，跳过")
+        return True
+
+    with tempfile.TemporaryDirectory() as directory:
+        private_dir = os.path.join(directory, "private")
+        FileCache(private_dir)
+        mode = os.stat(private_dir).st_mode & 0o777
+        print(f"   新建目录权限: {mode:o}")
+        if mode & 0o077:
+            print("❌ 缓存目录对其他用户可见")
+            return False
+
+        shared_dir = os.path.join(directory, "shared")
+        os.makedirs(shared_dir)
+        os.chmod(shared_dir, 0o777)
+        try:
+            FileCache(shared_dir)
+            print("❌ 没有拒绝其他用户可写的目录")
+            return False
+        except PermissionError:
+            pass
+
+        # 通过环境变量配置不安全的目录时，降级为只使用 L1
+        old_env = {name: os.environ.get(name) for name in ("CACHE_BACKEND", "CACHE_DIR")}
+        os.environ.update(CACHE_BACKEND="file", CACHE_DIR=shared_dir)
+        try:
+            if create_cache_from_env().l2 is not None:
+                print("❌ 不安全的缓存目录仍被使用")
+                return False
+        finally:
+            for name, value in old_env.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+
+    print("✓ 通过")
+    return True
+
+
+def run_all():
+    """运行所有缓存测试"""
+    print("=" * 60)
+    print("推荐结果缓存测试")
+    print("=" * 60)
+
+    results = [
+        check_serialization(),
+        check_single_flight(),
+        check_file_cache_across_processes(),
+        check_redis_sharded(),
+        check_hash_ring_consistency(),
+        check_l2_unavailable(),
+        check_lock_ownership(),
+        check_lock_released_without_value(),
+        check_cache_dir_permissions(),
+    ]
+
+    print("=" * 60)
+    if all(results):
+        print("✅ 所有测试通过!")
+    else:
+        print(f"❌ {results.count(False)} 项测试失败")
+    print("=" * 60)
+    return all(results)
+
+
+# pytest 入口：逐项断言检查结果（直接运行脚本时使用返回布尔值的 check_* 函数）
+
+def test_serialization():
+    assert check_serialization()
+
+
+def test_single_flight():
+    assert check_single_flight()
+
+
+def test_file_cache_across_processes():
+    assert check_file_cache_across_processes()
+
+
+def test_redis_sharded():
+    assert check_redis_sharded()
+
+
+def test_hash_ring_consistency():
+    assert check_hash_ring_consistency()
+
+
+def test_l2_unavailable():
+    assert check_l2_unavailable()
+
+
+def test_lock_ownership():
+    assert check_lock_ownership()
+
+
+def test_lock_released_without_value():
+    assert check_lock_released_without_value()
+
+
+def test_cache_dir_permissions():
+    assert check_cache_dir_permissions()
+
+
+if __name__ == '__main__':
+    success = run_all()
+    exit(0 if success else 1)
@@ -0,0 +1,232 @@
+"""
+离线 golden 文件测试脚本
+
+使用 golden/ 目录中录制和构造的模型输出，离线验证 recommend_core 中
+parse_response 和 build_prompt 的正确性，并统计每个用例的耗时，无需 API 密钥。
+
+目录结构：
+- golden/parse_response/<用例>.txt：模型原始输出，recorded_ 开头的用例是
+  python test_single_mood.py --record 录制的真实响应，其余为构造的边界情况
+- golden/parse_response/<用例>.expected.json：期望结果 {"recommendations": [...]} 或 {"error": "..."}
+- golden/build_prompt/<用例>.json：参数 {"mood": ..., "categories": ..., "max_count": ...}
+- golden/build_prompt/<用例>.expected.txt：期望的提示词
+
+用法：
+    python test_golden.py                  # 校验所有用例并输出耗时
+    python test_golden.py --update         # 为缺少期望结果的新用例（如新录制的响应）生成期望结果
+    python test_golden.py --overwrite      # 用当前实现覆盖不符的期望结果（修改解析逻辑后人工确认差异）
+    python test_golden.py --save-baseline  # 保存本机耗时基线，之后的运行会与之对比
+    python test_golden.py --strict-timing  # 耗时超过基线 TIMING_TOLERANCE 倍时视为失败
+"""
+
+import json
+import os
+import statistics
+import sys
+import time
+
+from recommend_core import RECOMMEND_MAX_COUNT, build_prompt, parse_response
+
+# golden 文件目录
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "golden")
+PARSE_DIR = os.path.join(GOLDEN_DIR, "parse_response")
+PROMPT_DIR = os.path.join(GOLDEN_DIR, "build_prompt")
+
+# 录制的真实模型响应的文件名前缀（见 test_single_mood.py）
+RECORDED_PREFIX = "recorded_"
+
+# 本机耗时基线文件（不提交到版本控制，不同机器的耗时不可比）
+BASELINE_PATH = os.path.join(GOLDEN_DIR, ".timings.json")
+
+# 计时配置
+TIMING_ROUNDS = 7              # 每个用例的计时轮数，取中位数
+TIMING_MIN_SECONDS = 0.01      # 每轮最短计时时长，耗时越短的用例重复次数越多
+TIMING_TOLERANCE = 2.0         # --strict-timing 下允许的相对基线的最大倍数
+
+
+def run_parse(text):
+    """运行 parse_response，把结果或异常统一转换为可比较的字典"""
+    try:
+        return {"recommendations": parse_response(text)}
+    except ValueError as e:
+        return {"error": str(e)}
+
+
+def run_prompt(params):
+    """运行 build_prompt"""
+    return build_prompt(params["mood"], params.get("categories"),
+                        params.get("max_count", RECOMMEND_MAX_COUNT))
+
+
+def measure(func):
+    """
+    测量 func() 的单次耗时
+
+    每轮自动确定重复次数，使单轮耗时不低于 TIMING_MIN_SECONDS，
+    返回多轮结果的中位数（微秒）。
+    """
+    repeat = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= TIMING_MIN_SECONDS:
+            break
+        repeat *= 2
+
+    samples = [elapsed / repeat]
+    for _ in range(TIMING_ROUNDS - 1):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            func()
+        samples.append((time.perf_counter() - start) / repeat)
+    return statistics.median(samples) * 1e6
+
+
+def load_cases():
+    """
+    加载所有用例
+
+    返回：
+        list: (用例名, 运行函数, 期望结果文件路径, 期望结果的读取/写入格式) 列表
+    """
+    cases = []
+
+    for name in sorted(os.listdir(PARSE_DIR)):
+        if not name.endswith(".txt"):
+            continue
+        with open(os.path.join(PARSE_DIR, name), encoding="utf-8") as f:
+            text = f.read()
+        case_name = name[:-len(".txt")]
+        expected_path = os.path.join(PARSE_DIR, case_name + ".expected.json")
+        cases.append((f"parse_response/{case_name}", lambda text=text: run_parse(text), expected_path, "json"))
+
+    for name in sorted(os.listdir(PROMPT_DIR)):
+        if not name.endswith(".json"):
+            continue
+        with open(os.path.join(PROMPT_DIR, name), encoding="utf-8") as f:
+            params = json.load(f)
+        case_name = name[:-len(".json")]
+        expected_path = os.path.join(PROMPT_DIR, case_name + ".expected.txt")
+        cases.append((f"build_prompt/{case_name}", lambda params=params: run_prompt(params), expected_path, "text"))
+
+    return cases
+
+
+def read_expected(path, kind):
+    """读取期望结果，文件不存在时返回 None"""
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f) if kind == "json" else f.read()
+
+
+def write_expected(path, kind, value):
+    """写入期望结果"""
+    with open(path, "w", encoding="utf-8") as f:
+        if kind == "json":
+            json.dump(value, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+        else:
+            f.write(value)
+
+
+def load_baseline():
+    """读取本机耗时基线，不存在时返回空字典"""
+    if not os.path.exists(BASELINE_PATH):
+        return {}
+    with open(BASELINE_PATH, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def check_golden(update=False, overwrite=False, save_baseline=False, strict_timing=False):
+    """
+    运行所有 golden 用例
+
+    参数：
+        update (bool): 为缺少期望结果的用例写入当前结果，已有的期望结果不会被修改
+        overwrite (bool): 用当前结果覆盖与期望不符的期望结果
+        save_baseline (bool): 保存本机耗时基线
+        strict_timing (bool): 耗时超过基线 TIMING_TOLERANCE 倍时视为失败
+    """
+    print("=" * 72)
+    print("离线 golden 文件测试")
+    print("=" * 72)
+
+    baseline = load_baseline()
+    timings = {}
+    failures = []
+
+    print(f"{'用例':<44}{'结果':<8}{'耗时(µs)':>10}{'基线比':>10}")
+    print("-" * 72)
+
+    cases = load_cases()
+    for name, func, expected_path, kind in cases:
+        actual = func()
+
+        expected = read_expected(expected_path, kind)
+        if expected is None:
+            if update or overwrite:
+                write_expected(expected_path, kind, actual)
+                status = "已生成"
+            else:
+                status = "缺少期望"
+                failures.append(name)
+        elif actual != expected:
+            if overwrite:
+                write_expected(expected_path, kind, actual)
+                status = "已覆盖"
+            else:
+                status = "❌ 不符"
+                failures.append(name)
+        else:
+            status = "✓"
+
+        timings[name] = measure(func)
+        ratio = ""
+        if name in baseline:
+            ratio_value = timings[name] / baseline[name]
+            ratio = f"{ratio_value:.2f}x"
+            if strict_timing and ratio_value > TIMING_TOLERANCE:
+                status = "❌ 变慢"
+                failures.append(name)
+
+        print(f"{name:<44}{status:<8}{timings[name]:>10.1f}{ratio:>10}")
+
+    print("-" * 72)
+    print(f"合计耗时: {sum(timings.values()):.1f} µs（{len(timings)} 个用例）")
+
+    if save_baseline:
+        with open(BASELINE_PATH, "w", encoding="utf-8") as f:
+            json.dump(timings, f, indent=2)
+        print(f"✓ 耗时基线已保存到: {BASELINE_PATH}")
+
+    if not any(name.startswith(f"parse_response/{RECORDED_PREFIX}") for name, *_ in cases):
+        print("⚠️  没有录制的真实模型响应，所有解析用例都是构造的")
+        print("   请运行 python test_single_mood.py --record 和 python test_golden.py --update 录制并提交")
+
+    print("=" * 72)
+    if failures:
+        print(f"❌ {len(failures)} 个用例失败: {', '.join(failures)}")
+        print("新用例请运行 python test_golden.py --update 生成期望结果；")
+        print("如果是预期内的行为变化，请运行 python test_golden.py --overwrite 并检查差异")
+    else:
+        print("✅ 所有用例通过!")
+    print("=" * 72)
+    return not failures
+
+
+def test_golden():
+    """pytest 入口：任一用例与期望不符或缺少期望结果时失败"""
+    assert check_golden()
+
+
+if __name__ == '__main__':
+    success = check_golden(
+        update="--update" in sys.argv,
+        overwrite="--overwrite" in sys.argv,
+        save_baseline="--save-baseline" in sys.argv,
+        strict_timing="--strict-timing" in sys.argv,
+    )
+    exit(0 if success else 1)
@@ -0,0 +1,328 @@
+"""
+用户收藏画像测试脚本
+
+验证 profiles.py 中 FavoritesProfile 和 ProfileStore 的增量更新、类别偏好、
+推荐重排和 LRU 淘汰，以及通过共享缓存在多个工作进程之间共享画像，无需 API 密钥。
+"""
+
+import os
+import tempfile
+
+from cache import FileCache
+from profiles import FAVORITE_FIELD_MAX_LENGTH, FavoritesProfile, ProfileStore, is_valid_favorite
+from recommend_core import RECOMMEND_MAX_COUNT
+
+# 测试用收藏数据
+FAVORITES = [
+    {"id": "f1", "title": "活着", "author": "余华", "category": "文学类", "subcategory": "小说"},
+    {"id": "f2", "title": "许三观卖血记", "author": "余华", "category": "文学类", "subcategory": "小说"},
+    {"id": "f3", "title": "人类简史", "author": "尤瓦尔·赫拉利", "category": "社科类", "subcategory": "历史"},
+]
+
+# 测试用推荐结果（模型输出）
+RECOMMENDATIONS = [
+    {"title": "时间简史", "author": "霍金", "category": "科普类", "subcategory": "物理"},
+    {"title": "《活着》", "author": "余华 ", "category": "文学类", "subcategory": "小说"},
+    {"title": "万历十五年", "author": "黄仁宇", "category": "社科类", "subcategory": "历史"},
+    {"title": "平凡的世界", "author": "路遥", "category": "文学类", "subcategory": "小说"},
+    {"title": "三体", "author": "刘慈欣", "category": ["科幻奇幻"], "subcategory": None},
+]
+
+
+def make_profile(favorites=FAVORITES):
+    """用收藏列表创建画像"""
+    profile = FavoritesProfile()
+    for fav in favorites:
+        profile.add(fav["id"], fav)
+    return profile
+
+
+def check_add_remove():
+    """测试收藏的增量添加和删除，同一本书被收藏多次时按引用计数处理"""
+    print("[增量添加与删除]")
+    profile = make_profile()
+    # 同一本书的第二份收藏（书名号和大小写不同）
+    profile.add("f4", {"id": "f4", "title": "《活着》", "author": "余华", "category": "文学类"})
+
+    if profile.add("f1", FAVORITES[0]):
+        print("❌ 重复的收藏 ID 被再次添加")
+        return False
+    if profile.category_weights != {"文学类": 3, "社科类": 1}:
+        print(f"❌ 类别权重不正确: {profile.category_weights}")
+        return False
+
+    profile.remove("f1")
+    if not profile.is_seen({"title": "活着", "author": "余华"}):
+        print("❌ 删除一份收藏后，仍有引用的书籍被移出已收藏集合")
+        return False
+    profile.remove("f4")
+    if profile.is_seen({"title": "活着", "author": "余华"}):
+        print("❌ 所有引用删除后，书籍仍在已收藏集合中")
+        return False
+    if profile.remove("f1"):
+        print("❌ 删除不存在的收藏返回了 True")
+        return False
+    if profile.category_weights != {"文学类": 1, "社科类": 1} or profile.subcategory_weights != {"小说": 1, "历史": 1}:
+        print(f"❌ 删除后的权重不正确: {profile.category_weights} {profile.subcategory_weights}")
+        return False
+
+    print("✓ 通过")
+    return True
+
+
+def check_top_categories():
+    """测试偏好类别按权重排序，并忽略系统不支持的类别"""
+    print("[偏好类别]")
+    profile = make_profile(FAVORITES + [
+        {"id": "f5", "title": "未知", "author": "某人", "category": "不存在的类别"},
+        {"id": "f6", "title": "未知2", "author": "某人", "category": "不存在的类别"},
+    ])
+    top = profile.top_categories()
+    print(f"   偏好类别: {top}")
+
+    if top != ["literature", "social_science"]:
+        print("❌ 偏好类别不正确")
+        return False
+    if profile.top_categories(limit=1) != ["literature"]:
+        print("❌ limit 没有生效")
+        return False
+
+    print("✓ 通过")
+    return True
+
+
+def check_rerank():
+    """测试重排过滤已收藏的书籍，并把匹配偏好的书籍排在前面"""
+    print("[推荐重排]")
+    profile = make_profile()
+    reranked = profile.rerank(RECOMMENDATIONS)
+    titles = [book["title"] for book in reranked]
+    print(f"   重排结果: {titles}")
+
+    if "《活着》" in titles:
+        print("❌ 已收藏的书籍没有被过滤")
+        return False
+    # 文学类（权重 2×2）> 社科类（权重 2×1 + 子类别 1）> 其他，得分相同时保持原始顺序
+    if titles != ["平凡的世界", "万历十五年", "时间简史", "三体"]:
+        print("❌ 重排顺序不正确")
+        return False
+    if len(profile.rerank(RECOMMENDATIONS, limit=2)) != 2:
+        print("❌ 数量上限没有生效")
+        return False
+
+    # 模型返回非字符串的类别时不应出错
+    if profile.score({"title": "x", "author": "y", "category": {"a": 1}, "subcategory": ["b"]}) != 0:
+        print("❌ 非字符串类别的得分不正确")
+        return False
+
+    print("✓ 通过")
+    return True
+
+
+def check_rerank_fallback():
+    """测试所有候选都已收藏时回退到原始推荐，画像不存在时返回 None"""
+    print("[重排回退]")
+    store = ProfileStore()
+    store.replace("user", [dict(book, id=f"r{i}") for i, book in enumerate(RECOMMENDATIONS)])
+
+    if store.get("user").rerank(RECOMMENDATIONS) != RECOMMENDATIONS[:RECOMMEND_MAX_COUNT]:
+        print("❌ 所有候选都已收藏时没有回退到原始推荐")
+        return False
+    if store.get("missing") is not None:
+        print("❌ 不存在的画像返回了快照")
+        return False
+
+    print("✓ 通过")
+    return True
+
+
+def check_snapshot():
+    """测试快照不受之后的修改影响，序列化后能完整恢复"""
+    print("[画像快照]")
+    store = ProfileStore()
+    store.replace("user", FAVORITES)
+    snapshot = store.get("user")
+    store.remove_favorite("user", "f3")
+
+    if snapshot.top_categories() != ["literature", "social_science"]:
+        print("❌ 快照被之后的修改影响")
+        return False
+    if store.get("user").top_categories() != ["literature"]:
+        print("❌ 修改后的画像不正确")
+        return False
+
+    profile = make_profile()
+    version, restored = FavoritesProfile.load(profile.dump("v1"))
+    if (version != "v1" or restored.books != profile.books or restored.seen != profile.seen
+            or restored.category_weights != profile.category_weights
+            or restored.subcategory_weights != profile.subcategory_weights):
+        print("❌ 序列化后恢复的画像不一致")
+        return False
+    restored.remove("f1")
+    if restored.seen != {("许三观卖血记", "余华"): 1, ("人类简史", "尤瓦尔·赫拉利"): 1}:
+        print("❌ 恢复的画像无法继续增量修改")
+        return False
+
+    print("✓ 通过")
+    return True
+
+
+def check_lru_eviction():
+    """测试内存中的画像超过上限时淘汰最久未使用的画像"""
+    print("[LRU 淘汰]")
+    store = ProfileStore(max_profiles=2)
+    store.add_favorite("a", "f1", FAVORITES[0])
+    store.add_favorite("b", "f1", FAVORITES[0])
+    # 访问 a，使 b 成为最久未使用的画像
+    store.get("a")
+    store.add_favorite("c", "f1", FAVORITES[0])
+
+    if store.get("b") is not None:
+        print("❌ 最久未使用的画像没有被淘汰")
+        return False
+    if store.get("a") is None or store.get("c") is None:
+        print("❌ 最近使用的画像被错误淘汰")
+        return False
+
+    print("✓ 通过")
+    return True
+
+
+class CountingCache(FileCache):
+    """记录读取次数的文件缓存"""
+
+    def __init__(self, directory):
+        super().__init__(directory)
+        self.reads = []
+
+    def get(self, key):
+        self.reads.append(key)
+        return super().get(key)
+
+
+def check_shared_store():
+    """测试两个工作进程通过共享缓存看到相同的画像，版本未变时只读取版本号"""
+    print("[共享画像]")
+    with tempfile.TemporaryDirectory() as directory:
+        l2 = CountingCache(os.path.join(directory, "cache"))
+        # 两个存储实例模拟两个工作进程
+        worker_a, worker_b = ProfileStore(l2=l2), ProfileStore(l2=l2)
+
+        worker_a.replace("user", FAVORITES[:1])
+        worker_b.add_favorite("user", "f3", FAVORITES[2])
+        if worker_a.get("user").top_categories() != ["literature", "social_science"]:
+            print("❌ 其他工作进程的修改不可见")
+            return False
+
+        worker_a.remove_favorite("user", "f1")
+        profile = worker_b.get("user")
+        titles = [book["title"] for book in profile.rerank(RECOMMENDATIONS)]
+        if "《活着》" not in titles or profile.overfetch_count() != 1:
+            print("❌ 删除收藏后其他工作进程的画像没有更新")
+            return False
+        if worker_b.remove_favorite("missing", "f1") or worker_b.get("missing") is not None:
+            print("❌ 不存在的画像被修改或读取")
+            return False
+
+        # 画像没有变化时，每次读取只需一次很短的版本号查询
+        l2.reads.clear()
+        worker_b.get("user")
+        worker_b.get("user")
+        print(f"   画像未变化时 2 次读取访问共享缓存 {len(l2.reads)} 次")
+        if len(l2.reads) != 2 or not all(key.endswith(":version") for key in l2.reads):
+            print("❌ 画像未变化时重复读取了完整数据")
+            return False
+
+    print("✓ 通过")
+    return True
+
+
+def check_validation():
+    """测试收藏数据校验拒绝缺失、非字符串和超长的字段"""
+    print("[收藏数据校验]")
+    too_long = "x" * (FAVORITE_FIELD_MAX_LENGTH + 1)
+    valid = [FAVORITES[0], {"id": "f1", "title": "活着", "author": "余华"}]
+    invalid = [
+        None,
+        {"id": "f1", "title": "活着"},
+        {"id": "f1", "title": "", "author": "余华"},
+        {"id": "f1", "title": too_long, "author": "余华"},
+        {"id": too_long, "title": "活着", "author": "余华"},
+        {"id": "f1", "title": "活着", "author": "余华", "category": too_long},
+        {"id": "f1", "title": "活着", "author": "余华", "subcategory": ["小说"]},
+    ]
+
+    if not all(is_valid_favorite(book) for book in valid):
+        print("❌ 合法的收藏被拒绝")
+        return False
+    if any(is_valid_favorite(book) for book in invalid):
+        print("❌ 不合法的收藏没有被拒绝")
+        return False
+
+    print("✓ 通过")
+    return True
+
+
+def run_all():
+    """运行所有画像测试"""
+    print("=" * 60)
+    print("用户收藏画像测试")
+    print("=" * 60)
+
+    results = [
+        check_add_remove(),
+        check_top_categories(),
+        check_rerank(),
+        check_rerank_fallback(),
+        check_snapshot(),
+        check_lru_eviction(),
+        check_shared_store(),
+        check_validation(),
+    ]
+
+    print("=" * 60)
+    if all(results):
+        print("✅ 所有测试通过!")
+    else:
+        print(f"❌ {results.count(False)} 项测试失败")
+    print("=" * 60)
+    return all(results)
+
+
+# pytest 入口：逐项断言检查结果（直接运行脚本时使用返回布尔值的 check_* 函数）
+
+def test_add_remove():
+    assert check_add_remove()
+
+
+def test_top_categories():
+    assert check_top_categories()
+
+
+def test_rerank():
+    assert check_rerank()
+
+
+def test_rerank_fallback():
+    assert check_rerank_fallback()
+
+
+def test_snapshot():
+    assert check_snapshot()
+
+
+def test_lru_eviction():
+    assert check_lru_eviction()
+
+
+def test_shared_store():
+    assert check_shared_store()
+
+
+def test_validation():
+    assert check_validation()
+
+
+if __name__ == '__main__':
+    success = run_all()
+    exit(0 if success else 1)
@@ -0,0 +1,267 @@
+"""
+模型后端路由测试脚本
+
+在本地启动若干个模拟的 OpenAI 兼容服务（不同延迟、不同错误率），
+验证 backends.py 中路由器的选择策略、故障转移、重试策略和配额分流，无需真实 API 密钥。
+"""
+
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from backends import Backend, BackendRegistry, Router, is_retryable
+
+
+class MockServer:
+    """
+    模拟的 OpenAI 兼容服务
+
+    参数：
+        latency (float): 每个请求的响应延迟（秒）
+        fail (bool): 是否对所有请求返回错误
+        status (int): 返回错误时的 HTTP 状态码，默认 500
+    """
+
+    def __init__(self, latency=0.0, fail=False, status=500):
+        self.latency = latency
+        self.fail = fail
+        self.status = status
+        self.hits = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self._server.server_address[1]}/v1"
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                with server._lock:
+                    server.hits += 1
+                time.sleep(server.latency)
+
+                if server.fail:
+                    status, payload = server.status, {"error": {"message": "mock failure"}}
+                else:
+                    status, payload = 200, {
+                        "id": "mock",
+                        "object": "chat.completion",
+                        "created": 0,
+                        "model": body.get("model", "mock"),
+                        "choices": [{
+                            "index": 0,
+                            "message": {"role": "assistant", "content": "[]"},
+                            "finish_reason": "stop",
+                        }],
+                    }
+
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                # 关闭默认的访问日志
+                pass
+
+        return Handler
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def make_backend(name, server, **kwargs):
+    """创建指向模拟服务的后端"""
+    return Backend(name=name, model=f"mock-{name}", base_url=server.base_url,
+                   api_key="mock-key", **kwargs)
+
+
+def run_requests(router, count, workers):
+    """
+    并发发送请求
+
+    返回：
+        tuple: (成功数, 失败数, 总耗时秒)
+    """
+    def call(_):
+        try:
+            router.complete(messages=[{"role": "user", "content": "ping"}], timeout=5)
+            return True
+        except Exception:
+            return False
+
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(call, range(count)))
+    return results.count(True), results.count(False), time.monotonic() - start
+
+
+def print_stats(router):
+    """打印各后端的路由统计"""
+    print("-" * 60)
+    for stat in router.stats():
+        latency = stat["latency_ewma"]
+        latency_text = f"{latency * 1000:.0f} ms" if latency is not None else "N/A"
+        print(f"   {stat['name']:<8} 请求: {stat['requests']:>3}  失败: {stat['errors']:>3}  "
+              f"延迟 EWMA: {latency_text}")
+    print("-" * 60)
+
+
+def check_latency_routing():
+    """测试路由器优先选择低延迟后端，并从故障后端转移"""
+    print("=" * 60)
+    print("延迟感知路由与故障转移测试")
+    print("=" * 60)
+
+    with MockServer(latency=0.02) as fast, MockServer(latency=0.3) as slow, \
+            MockServer(fail=True) as broken:
+        router = Router(BackendRegistry([
+            make_backend("fast", fast, max_concurrency=4),
+            make_backend("slow", slow, max_concurrency=4),
+            make_backend("broken", broken, max_concurrency=4),
+        ]))
+
+        succeeded, failed, elapsed = run_requests(router, count=60, workers=6)
+        print(f"完成 {succeeded + failed} 个请求，成功 {succeeded}，失败 {failed}，耗时 {elapsed:.2f} 秒")
+        print_stats(router)
+
+        if failed:
+            print("❌ 故障转移失败: 存在未成功的请求")
+            return False
+        if not fast.hits > slow.hits:
+            print("❌ 路由失败: 低延迟后端承担的请求没有多于高延迟后端")
+            return False
+        if broken.hits > 10:
+            print("❌ 路由失败: 故障后端仍然持续收到请求")
+            return False
+
+    print("✅ 测试通过!")
+    print()
+    return True
+
+
+def check_quota_scaling():
+    """测试多个后端合计的吞吐可以超过单个后端的配额"""
+    print("=" * 60)
+    print("配额分流测试")
+    print("=" * 60)
+
+    with MockServer(latency=0.01) as first, MockServer(latency=0.01) as second, \
+            MockServer(latency=0.01) as third:
+        servers = [first, second, third]
+        router = Router(BackendRegistry([
+            make_backend(f"b{i}", server, max_concurrency=4, rpm=10)
+            for i, server in enumerate(servers)
+        ]), acquire_timeout=0.5)
+
+        # 单个后端每分钟只允许 10 个请求，3 个后端合计 30 个
+        succeeded, failed, elapsed = run_requests(router, count=30, workers=6)
+        print(f"完成 {succeeded + failed} 个请求，成功 {succeeded}，失败 {failed}，耗时 {elapsed:.2f} 秒")
+        print_stats(router)
+
+        if failed:
+            print("❌ 配额分流失败: 存在未成功的请求")
+            return False
+        if any(server.hits > 10 for server in servers):
+            print("❌ 配额分流失败: 某个后端超出了配额")
+            return False
+
+        # 配额全部用完后，新的请求应当快速失败而不是无限等待
+        succeeded, failed, _ = run_requests(router, count=1, workers=1)
+        if succeeded:
+            print("❌ 配额检查失败: 配额耗尽后请求仍然成功")
+            return False
+
+    print("✅ 测试通过!")
+    print()
+    return True
+
+
+def check_retry_policy():
+    """测试只有连接错误、超时、429 和 5xx 才会转移到其他后端"""
+    print("=" * 60)
+    print("重试策略测试")
+    print("=" * 60)
+
+    messages = [{"role": "user", "content": "ping"}]
+
+    # 400 是请求本身的问题，换后端也不会成功：立即抛出，不转移，不计入错误率
+    with MockServer(fail=True, status=400) as bad_request, MockServer() as healthy:
+        bad = make_backend("bad", bad_request)
+        router = Router(BackendRegistry([bad, make_backend("ok", healthy)]))
+        try:
+            router.complete(messages=messages, timeout=5)
+            print("❌ 400 错误没有被抛出")
+            return False
+        except Exception as e:
+            print(f"   400: {type(e).__name__}，可重试: {is_retryable(e)}")
+        if bad_request.hits != 1 or healthy.hits != 0:
+            print("❌ 400 错误被重试或转移到了其他后端")
+            return False
+        if bad.stats()["error_ewma"] != 0:
+            print("❌ 400 错误计入了后端的错误率")
+            return False
+
+    # 503 和 429 可以重试：转移到健康的后端
+    for status in (503, 429):
+        with MockServer(fail=True, status=status) as unavailable, MockServer() as healthy:
+            router = Router(BackendRegistry([make_backend("down", unavailable),
+                                             make_backend("ok", healthy)]))
+            router.complete(messages=messages, timeout=5)
+            print(f"   {status}: 转移到健康后端")
+            if unavailable.hits != 1 or healthy.hits != 1:
+                print(f"❌ {status} 错误没有转移到其他后端")
+                return False
+
+    # 重试时等不到槽位，应当抛出真正的错误而不是 rate_limit
+    with MockServer(fail=True) as broken:
+        router = Router(BackendRegistry([make_backend("only", broken, rpm=1)]),
+                        acquire_timeout=0.2)
+        try:
+            router.complete(messages=messages, timeout=5)
+            print("❌ 请求意外成功")
+            return False
+        except Exception as e:
+            print(f"   配额耗尽后的重试: {type(e).__name__}")
+            if "rate_limit" in str(e) or getattr(e, "status_code", None) != 500:
+                print("❌ 没有抛出导致失败的原始错误")
+                return False
+
+    print("✅ 测试通过!")
+    print()
+    return True
+
+
+# pytest 入口：逐项断言检查结果（直接运行脚本时使用返回布尔值的 check_* 函数）
+
+def test_latency_routing():
+    assert check_latency_routing()
+
+
+def test_quota_scaling():
+    assert check_quota_scaling()
+
+
+def test_retry_policy():
+    assert check_retry_policy()
+
+
+if __name__ == '__main__':
+    results = [check_latency_routing(), check_quota_scaling(), check_retry_policy()]
+    exit(0 if all(results) else 1)
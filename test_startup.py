@@ -0,0 +1,144 @@
+"""
+冷启动性能测试脚本
+
+使用 `python -X importtime` 测量导入 app.py 和创建应用的耗时，
+并检查重量级依赖（火山引擎 ARK SDK、OpenAI SDK）没有在启动阶段被导入。
+
+可通过环境变量 STARTUP_BUDGET_MS 调整耗时预算（默认 500 毫秒）
+"""
+
+import os
+import subprocess
+import sys
+import time
+
+# 启动耗时预算（毫秒）
+STARTUP_BUDGET_MS = int(os.environ.get("STARTUP_BUDGET_MS", 500))
+
+# 启动阶段不应导入的模块
+DEFERRED_MODULES = ["volcenginesdkarkruntime", "openai", "dotenv"]
+
+# 在子进程中执行的启动代码
+# 只导入模块并创建应用，不发送任何请求
+STARTUP_CODE = "import app; app.create_app()"
+
+# 导入模块时执行的代码（不创建应用）
+IMPORT_CODE = "import app"
+
+
+def parse_importtime(stderr):
+    """
+    解析 -X importtime 输出
+
+    参数：
+        stderr (str): 子进程的标准错误输出
+
+    返回：
+        list: (模块名, 自身耗时微秒, 累计耗时微秒) 列表
+    """
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3:
+            continue
+        try:
+            self_us = int(parts[0].strip())
+            cumulative_us = int(parts[1].strip())
+        except ValueError:
+            # 跳过表头行
+            continue
+        modules.append((parts[2].strip(), self_us, cumulative_us))
+    return modules
+
+
+def run_startup(code):
+    """
+    在全新的子进程中执行启动代码并统计耗时
+
+    参数：
+        code (str): 要执行的 Python 代码
+
+    返回：
+        tuple: (墙钟耗时毫秒, importtime 解析结果)
+    """
+    # 去掉 API 密钥，确保启动阶段不依赖外部配置
+    env = dict(os.environ)
+    env.pop("ARK_API_KEY", None)
+
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    elapsed_ms = (time.perf_counter() - start) * 1000
+
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+
+    return elapsed_ms, parse_importtime(result.stderr)
+
+
+def check_startup_time():
+    """测试冷启动耗时和延迟导入"""
+    print("=" * 60)
+    print("冷启动性能测试")
+    print(f"耗时预算: {STARTUP_BUDGET_MS} ms")
+    print("=" * 60)
+    print()
+
+    try:
+        # 检查导入模块时没有加载延迟导入的依赖
+        _, import_modules = run_startup(IMPORT_CODE)
+        imported = {name.split(".")[0] for name, _, _ in import_modules}
+        leaked = [name for name in DEFERRED_MODULES if name in imported]
+        if leaked:
+            print(f"❌ 导入 app 时加载了应延迟导入的模块: {', '.join(leaked)}")
+            return False
+        print("✓ 导入 app 时未加载模型 SDK 和 python-dotenv")
+
+        # 测量导入并创建应用的总耗时
+        elapsed_ms, modules = run_startup(STARTUP_CODE)
+        app_entry = next((m for m in modules if m[0] == "app"), None)
+        import_ms = app_entry[2] / 1000 if app_entry else 0.0
+
+        print(f"✓ 导入 app 累计耗时: {import_ms:.1f} ms")
+        print(f"✓ 进程总耗时（含解释器启动）: {elapsed_ms:.1f} ms")
+        print()
+
+        # 列出累计耗时最高的顶层模块，便于定位启动瓶颈
+        top_level = [m for m in modules if "." not in m[0]]
+        top_level.sort(key=lambda m: -m[2])
+        print("耗时最高的顶层模块:")
+        print("-" * 60)
+        for name, _, cumulative_us in top_level[:10]:
+            print(f"   {cumulative_us / 1000:8.1f} ms  {name}")
+        print("-" * 60)
+        print()
+
+        if elapsed_ms > STARTUP_BUDGET_MS:
+            print(f"❌ 启动耗时 {elapsed_ms:.1f} ms 超出预算 {STARTUP_BUDGET_MS} ms")
+            return False
+
+        print("=" * 60)
+        print("✅ 测试通过! 启动耗时在预算内")
+        print("=" * 60)
+        return True
+
+    except Exception as e:
+        print(f"❌ 测试失败: {str(e)}")
+        return False
+
+
+def test_startup_time():
+    """pytest 入口：启动耗时超出预算或提前导入了模型 SDK 时失败"""
+    assert check_startup_time()
+
+
+if __name__ == '__main__':
+    success = check_startup_time()
+    exit(0 if success else 1)